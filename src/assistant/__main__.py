@@ -1,7 +1,11 @@
+import sys
+import signal
 from src.db.db_init import schema_init
 from src.assistant.server import server_init
 
 def main():
+    # docker stop шлёт SIGTERM процессу с PID 1; SystemExit даёт atexit сбросить буферы логов
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
     schema_init()
     server_init()
 
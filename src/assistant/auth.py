@@ -2,21 +2,29 @@ import os
 import re
 import secrets
 import hashlib
+import hmac
+import threading
+import time
+from collections import namedtuple
 from datetime import datetime, timedelta, timezone
 import bcrypt
+from argon2 import PasswordHasher
 
-from sqlalchemy import select, func, text
+from sqlalchemy import select, update, text, or_, case
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import load_only
 
 from src.db.models.user import User
 from src.db.models.session import Session as DbSession
 from src.db.models.auth_code import AuthCode
 
-from src.db.db import SessionLocal
-import json
+from src.db.db import SessionLocal, engine
+import orjson
 from http.server import BaseHTTPRequestHandler
 
-from src.utils.logger import Logger
-from src.utils.mailer import send_email, build_confirm_email, build_reset_email
+from src.utils.logger import Logger, WARN
+from src.utils.mailer import build_confirm_email, build_reset_email
+from src.utils.mailer_queue import enqueue_email
 
 # Config
 AUTH_ENABLED = os.getenv("AUTH_ENABLED", "true").lower() == "true"
@@ -31,41 +39,134 @@ SESSION_TTL_DAYS     = int(os.getenv("SESSION_TTL_DAYS", "30"))
 ROLLING_TTL_ON_TOUCH = os.getenv("ROLLING_TTL_ON_TOUCH", "true").lower() == "true"
 
 _AUTH_CODE_PEPPER    = os.getenv("AUTH_CODE_PEPPER", "dev-pepper-change-me")
+_AUTH_CODE_PEPPER_BYTES = _AUTH_CODE_PEPPER.encode("utf-8")
+
+SESSION_CACHE_TTL_SEC      = int(os.getenv("SESSION_CACHE_TTL_SEC", "30"))
+SESSION_TOUCH_INTERVAL_SEC = int(os.getenv("SESSION_TOUCH_INTERVAL_SEC", "60"))
 
 UTC = timezone.utc
 
 logger = Logger("auth")
 logger.ensure_log_dir()
 
+# Session cache: token_hash -> (user_id, session_id, expires_at, cached_until); only active users are cached
+AuthUser = namedtuple("AuthUser", ["id", "is_active"])
+AuthSession = namedtuple("AuthSession", ["id", "user_id", "expires_at"])
+
+_SESSION_CACHE: dict[str, tuple] = {}
+_SESSION_CACHE_LOCK = threading.Lock()
+_LAST_SEEN_FLUSH: dict[str, float] = {}
+
+def _session_cache_get(token_hash: str, now: datetime) -> tuple | None:
+    with _SESSION_CACHE_LOCK:
+        entry = _SESSION_CACHE.get(token_hash)
+        if entry is None:
+            return None
+        if entry[3] <= time.monotonic() or entry[2] <= now:
+            _SESSION_CACHE.pop(token_hash, None)
+            return None
+        return entry
+
+def _session_cache_put(token_hash: str, user_id: int, session_id: int, expires_at: datetime):
+    if SESSION_CACHE_TTL_SEC <= 0:
+        return
+    with _SESSION_CACHE_LOCK:
+        _SESSION_CACHE[token_hash] = (user_id, session_id, expires_at, time.monotonic() + SESSION_CACHE_TTL_SEC)
+
+def _session_cache_drop(token_hash: str):
+    with _SESSION_CACHE_LOCK:
+        _SESSION_CACHE.pop(token_hash, None)
+        _LAST_SEEN_FLUSH.pop(token_hash, None)
+
+def _session_cache_drop_user(user_id: int):
+    with _SESSION_CACHE_LOCK:
+        for token_hash in [h for h, entry in _SESSION_CACHE.items() if entry[0] == user_id]:
+            _SESSION_CACHE.pop(token_hash, None)
+            _LAST_SEEN_FLUSH.pop(token_hash, None)
+
+def _touch_due(token_hash: str) -> bool:
+    now = time.monotonic()
+    with _SESSION_CACHE_LOCK:
+        last = _LAST_SEEN_FLUSH.get(token_hash)
+        if last is not None and now - last < SESSION_TOUCH_INTERVAL_SEC:
+            return False
+        if len(_LAST_SEEN_FLUSH) > 10000:
+            _LAST_SEEN_FLUSH.clear()
+        _LAST_SEEN_FLUSH[token_hash] = now
+        return True
+
 # Helpers
 def _now_utc() -> datetime:
     return datetime.now(tz=UTC)
 
+_LOGIN_RE = re.compile(r"[A-Za-z0-9_]{3,64}")
+
 def _validate_email(email: str) -> bool:
-    return bool(email) and "@" in email and "." in email and len(email) <= 320
+    if not email or len(email) > 320:
+        return False
+    at = email.rfind("@")
+    return at > 0 and "." in email[at:]
 
 def _validate_login(login: str) -> bool:
-    return bool(re.fullmatch(r"[A-Za-z0-9_]{3,64}", login))
+    return _LOGIN_RE.fullmatch(login) is not None
+
+_password_hasher = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+
+def _is_bcrypt_hash(hashed: str) -> bool:
+    return hashed.startswith(("$2a$", "$2b$", "$2y$"))
 
 def _hash_password(raw: str) -> str:
-    return bcrypt.hashpw(raw.encode("utf-8"), bcrypt.gensalt(rounds=12)).decode("utf-8")
+    return _password_hasher.hash(raw)
 
 def _verify_password(raw: str, hashed: str) -> bool:
     try:
-        return bcrypt.checkpw(raw.encode("utf-8"), hashed.encode("utf-8"))
+        if _is_bcrypt_hash(hashed):
+            return bcrypt.checkpw(raw.encode("utf-8"), hashed.encode("utf-8"))
+        return _password_hasher.verify(hashed, raw)
+    except Exception:
+        return False
+
+def _password_needs_rehash(hashed: str) -> bool:
+    if _is_bcrypt_hash(hashed):
+        return True
+    try:
+        return _password_hasher.check_needs_rehash(hashed)
     except Exception:
         return False
 
 def _gen_code(n: int = AUTH_CODE_LEN) -> str:
-    first = str(secrets.randbelow(9) + 1)
-    rest = "".join(str(secrets.randbelow(10)) for _ in range(max(0, n -1)))
-    return first + rest
+    # one urandom read per batch; bytes above 251/249 are rejected to keep digits uniform
+    digits = []
+    while len(digits) < n:
+        for b in secrets.token_bytes(n * 2):
+            if not digits:
+                if b < 252:
+                    digits.append(chr(49 + b % 9))
+            elif b < 250:
+                digits.append(chr(48 + b % 10))
+            if len(digits) == n:
+                break
+    return "".join(digits)
 
 def _hash_code(code: str) -> str:
-    h = hashlib.sha256()
-    h.update(_AUTH_CODE_PEPPER.encode("utf-8"))
-    h.update(code.encode("utf-8"))
-    return h.hexdigest()
+    return hmac.new(_AUTH_CODE_PEPPER_BYTES, code.encode("utf-8"), "sha256").hexdigest()
+
+# Codes issued before the switch to HMAC are stored as sha256(pepper + code); they stay
+# valid until they could have expired anyway (AUTH_CODE_TTL_MIN after start).
+_LEGACY_CODE_HASH_UNTIL = time.monotonic() + AUTH_CODE_TTL_MIN * 60
+
+def _legacy_hash_code(code: str) -> str:
+    return hashlib.sha256(_AUTH_CODE_PEPPER_BYTES + code.encode("utf-8")).hexdigest()
+
+def _code_matches(code_hash: str, code: str) -> bool:
+    if hmac.compare_digest(code_hash, _hash_code(code)):
+        return True
+    if time.monotonic() < _LEGACY_CODE_HASH_UNTIL:
+        return hmac.compare_digest(code_hash, _legacy_hash_code(code))
+    return False
+
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
 
 def _extract_bearer(self) -> str | None:
     auth = self.headers.get("Authorization") or ""
@@ -79,7 +180,7 @@ def _parse_json_body(handler: BaseHTTPRequestHandler):
         return None
     raw = handler.rfile.read(length)
     try:
-        return json.loads(raw.decode("utf-8"))
+        return orjson.loads(raw)
     except Exception:
         from src.assistant.server import ValidationError
         raise ValidationError("Invalid JSON body")
@@ -96,6 +197,52 @@ def _client_ip(handler: BaseHTTPRequestHandler) -> str | None:
     except Exception:
         return None
 
+def _upsert_auth_code(db, user_id: int, purpose: str, code_hash: str, now: datetime) -> int | None:
+    # Insert a fresh code or replace the existing one in a single statement.
+    # An expired code restarts the send counter; a live one at the limit is left untouched (no row returned).
+    stmt = pg_insert(AuthCode).values(
+        user_id=user_id, purpose=purpose,
+        code_hash=code_hash,
+        created_at=now, expires_at=now + timedelta(minutes=AUTH_CODE_TTL_MIN),
+        send_count=1, last_sent_at=now,
+        input_count=0, last_input_at=None,
+    )
+    expired = AuthCode.expires_at <= now
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "purpose"],
+        set_={
+            "code_hash": stmt.excluded.code_hash,
+            "created_at": stmt.excluded.created_at,
+            "expires_at": stmt.excluded.expires_at,
+            "send_count": case((expired, 1), else_=AuthCode.send_count + 1),
+            "last_sent_at": stmt.excluded.last_sent_at,
+            "input_count": 0,
+            "last_input_at": None,
+        },
+        where=or_(expired, AuthCode.send_count < MAX_SEND_PER_CODE),
+    ).returning(AuthCode.send_count)
+    return db.scalar(stmt)
+
+def _auth_code_retry_after(db, user_id: int, purpose: str, now: datetime) -> int:
+    expires_at = db.scalar(
+        select(AuthCode.expires_at).where(AuthCode.user_id == user_id, AuthCode.purpose == purpose)
+    )
+    return int((expires_at - now).total_seconds()) if expires_at else 0
+
+# Raw lookups for the hot read paths (no ORM identity map / unit of work)
+_SESSION_LOOKUP = text("SELECT id, user_id, revoked_at, expires_at FROM sessions WHERE session_hash = :h")
+_USER_LOOKUP = text("SELECT id, is_active, current_session_id FROM users WHERE id = :i")
+_USER_PROFILE_LOOKUP = text(
+    "SELECT id, email, login, is_active, email_confirmed_at, last_login_at, last_login_ip FROM users WHERE id = :i"
+)
+_USER_BY_EMAIL_LOOKUP = text("SELECT id, is_active FROM users WHERE email = :e")
+_CONFIRM_CODE_LOOKUP = text(
+    "SELECT send_count, input_count, expires_at FROM auth_codes WHERE user_id = :u AND purpose = 'email_confirm'"
+)
+_SESSION_REVOKE = text("UPDATE sessions SET revoked_at = :now WHERE id = :i")
+_SESSION_TOUCH = text("UPDATE sessions SET last_seen_at = :now WHERE id = :i")
+_SESSION_TOUCH_ROLLING = text("UPDATE sessions SET last_seen_at = :now, expires_at = :exp WHERE id = :i")
+
 # Auth routes
 AUTH_ROUTES = [
     ("POST", re.compile(r"^/api/auth/register$"),           "auth_register"),
@@ -142,63 +289,55 @@ def auth_register(self, match, query):
                 return True
             return False
 
-        existing_email_user = db.execute(select(User).where(User.email == email)).scalar_one_or_none()
+        existing_users = db.execute(
+            select(User).where(or_(User.email == email, User.login == login))
+        ).scalars().all()
+        existing_email_user = next((u for u in existing_users if u.email == email), None)
+        existing_login_user = next((u for u in existing_users if u.login == login and u is not existing_email_user), None)
+
         if not _cleanup_inactive_with_expired_code(existing_email_user) and existing_email_user:
             return self._json_error(409, "conflict", "Email already registered")
 
-        existing_login_user = db.execute(select(User).where(User.login == login)).scalar_one_or_none()
         if not _cleanup_inactive_with_expired_code(existing_login_user) and existing_login_user:
             return self._json_error(409, "conflict", "Login already taken")
 
-        user = User(email=email, login=login, password_hash=_hash_password(password), is_active=False)
-        db.add(user)
-        db.flush()
+        user_id = db.scalar(
+            pg_insert(User)
+            .values(email=email, login=login, password_hash=_hash_password(password), is_active=False)
+            .on_conflict_do_nothing()
+            .returning(User.id)
+        )
+        if user_id is None:
+            db.rollback()
+            conflict = db.execute(
+                select(case((User.email == email, "email"), else_="login"))
+                .where(or_(User.email == email, User.login == login))
+                .order_by(case((User.email == email, 0), else_=1))
+                .limit(1)
+            ).scalar_one_or_none()
+            if conflict == "login":
+                return self._json_error(409, "conflict", "Login already taken")
+            return self._json_error(409, "conflict", "Email already registered")
 
         code = _gen_code(AUTH_CODE_LEN)
-        code_hash = _hash_code(code)
-        auth_code = db.execute(
-            select(AuthCode).where(AuthCode.user_id == user.id, AuthCode.purpose == "email_confirm")
-        ).scalar_one_or_none()
-
-        expires = now + timedelta(minutes=AUTH_CODE_TTL_MIN)
-        if auth_code is None:
-            auth_code = AuthCode(
-                user_id=user.id,
-                purpose="email_confirm",
-                code_hash=code_hash,
-                created_at=now,
-                expires_at=expires,
-                send_count=1,
-                last_sent_at=now,
-                input_count=0,
-                last_input_at=None,
-            )
-            db.add(auth_code)
-        else:
-            if auth_code.send_count >= MAX_SEND_PER_CODE:
-                db.rollback()
-                return self._json_error(429, "too_many_requests", "Resend limit reached",
-                                        {"retry_after": int((auth_code.expires_at - now).total_seconds())})
-            auth_code.code_hash = code_hash
-            auth_code.created_at = now
-            auth_code.expires_at = expires
-            auth_code.send_count = auth_code.send_count + 1
-            auth_code.last_sent_at = now
-            auth_code.input_count = 0
-            auth_code.last_input_at = None
+        send_count = _upsert_auth_code(db, user_id, "email_confirm", _hash_code(code), now)
+        if send_count is None:
+            retry_after = _auth_code_retry_after(db, user_id, "email_confirm", now)
+            db.rollback()
+            return self._json_error(429, "too_many_requests", "Resend limit reached", {"retry_after": retry_after})
 
         db.commit()
         subject, mail_text, html = build_confirm_email(code, AUTH_CODE_TTL_MIN)
-        send_email(email, subject, mail_text, html)
+        enqueue_email(email, subject, mail_text, html)
 
-        logger.write(f"[REGISTER] IP: {_client_ip(self)}, Login: {login}, Email: {email}")
+        logger.write("[REGISTER] IP: %s, Login: %s, Email: %s", _client_ip(self), login, email)
 
         return self._json_ok({
             "status": "pending",
             "email": email,
             "login": login,
             "code_ttl_sec": AUTH_CODE_TTL_MIN * 60,
-            "send_count": auth_code.send_count
+            "send_count": send_count
         }, status=201)
 
 
@@ -209,55 +348,24 @@ def auth_register_resend(self, match, query):
         return self._json_error(400, "bad_request", "Invalid fields", {"email": "Invalid email"})
 
     with SessionLocal() as db:
-        user = db.execute(select(User).where(User.email == email)).scalar_one_or_none()
+        user = db.execute(select(User.id, User.is_active).where(User.email == email)).first()
         if not user:
             return self._json_error(404, "not_found", "User not found")
         if user.is_active:
             return self._json_ok({"status": "already_confirmed"})
 
         now = _now_utc()
-        auth_code = db.execute(
-            select(AuthCode).where(AuthCode.user_id == user.id, AuthCode.purpose == "email_confirm")
-        ).scalar_one_or_none()
-
-        if auth_code and auth_code.expires_at <= now:
-            db.delete(auth_code)
-            db.flush()
-            auth_code = None
-
-        if auth_code is None:
-            code = _gen_code(AUTH_CODE_LEN)
-            auth_code = AuthCode(
-                user_id=user.id, purpose="email_confirm",
-                code_hash=_hash_code(code),
-                created_at=now,
-                expires_at=now + timedelta(minutes=AUTH_CODE_TTL_MIN),
-                send_count=1, last_sent_at=now,
-                input_count=0, last_input_at=None,
-            )
-            db.add(auth_code)
-            db.commit()
-            subject, mail_text, html = build_confirm_email(code, AUTH_CODE_TTL_MIN)
-            send_email(email, subject, mail_text, html)
-            return self._json_ok({"status": "resent", "send_count": 1, "code_ttl_sec": AUTH_CODE_TTL_MIN * 60})
-
-        if auth_code.send_count >= MAX_SEND_PER_CODE:
-            return self._json_error(429, "too_many_requests", "Resend limit reached",
-                                    {"retry_after": int((auth_code.expires_at - now).total_seconds())})
-
         code = _gen_code(AUTH_CODE_LEN)
-        auth_code.code_hash = _hash_code(code)
-        auth_code.created_at = now
-        auth_code.expires_at = now + timedelta(minutes=AUTH_CODE_TTL_MIN)
-        auth_code.send_count = auth_code.send_count + 1
-        auth_code.last_sent_at = now
-        auth_code.input_count = 0
-        auth_code.last_input_at = None
+        send_count = _upsert_auth_code(db, user.id, "email_confirm", _hash_code(code), now)
+        if send_count is None:
+            retry_after = _auth_code_retry_after(db, user.id, "email_confirm", now)
+            db.rollback()
+            return self._json_error(429, "too_many_requests", "Resend limit reached", {"retry_after": retry_after})
         db.commit()
 
         subject, mail_text, html = build_confirm_email(code, AUTH_CODE_TTL_MIN)
-        send_email(email, subject, mail_text, html)
-        return self._json_ok({"status": "resent", "send_count": auth_code.send_count, "code_ttl_sec": AUTH_CODE_TTL_MIN * 60})
+        enqueue_email(email, subject, mail_text, html)
+        return self._json_ok({"status": "resent", "send_count": send_count, "code_ttl_sec": AUTH_CODE_TTL_MIN * 60})
 
 
 def auth_register_confirm(self, match, query):
@@ -272,11 +380,11 @@ def auth_register_confirm(self, match, query):
         return self._json_error(400, "bad_request", "Invalid fields", errors)
 
     with SessionLocal() as db:
-        user = db.execute(select(User).where(User.email == email)).scalar_one_or_none()
+        user = db.execute(select(User.id, User.login, User.is_active).where(User.email == email)).first()
         if not user:
             return self._json_error(404, "not_found", "User not found")
         if user.is_active:
-            logger.write(f"[REGISTER CONFIRM] Already confirmed: IP: {_client_ip(self)}, Login: {user.login}, Email: {email}")
+            logger.write("[REGISTER CONFIRM] Already confirmed: IP: %s, Login: %s, Email: %s", _client_ip(self), user.login, email)
             return self._json_ok({"status": "already_confirmed"})
 
         auth_code = db.execute(
@@ -289,29 +397,28 @@ def auth_register_confirm(self, match, query):
         if auth_code.expires_at <= now:
             db.delete(auth_code)
             db.commit()
-            logger.write(f"[REGISTER CONFIRM] Code expired: IP: {_client_ip(self)}, Login: {user.login}, Email: {email}")
+            logger.write("[REGISTER CONFIRM] Code expired: IP: %s, Login: %s, Email: %s", _client_ip(self), user.login, email, level=WARN)
             return self._json_error(400, "bad_request", "Code expired")
 
         if auth_code.input_count >= MAX_INPUT_ATTEMPTS:
             db.delete(auth_code)
             db.commit()
-            logger.write(f"[REGISTER CONFIRM] Input attempts limit reached: IP: {_client_ip(self)}, Login: {user.login}, Email: {email}")
+            logger.write("[REGISTER CONFIRM] Input attempts limit reached: IP: %s, Login: %s, Email: %s", _client_ip(self), user.login, email, level=WARN)
             return self._json_error(429, "too_many_requests", "Input attempts limit reached")
 
         auth_code.input_count = auth_code.input_count + 1
         auth_code.last_input_at = now
 
-        if auth_code.code_hash != _hash_code(code):
+        if not _code_matches(auth_code.code_hash, code):
             db.commit()
-            logger.write(f"[REGISTER CONFIRM] Invalid code: IP: {_client_ip(self)}, Login: {user.login}, Email: {email}")
+            logger.write("[REGISTER CONFIRM] Invalid code: IP: %s, Login: %s, Email: %s", _client_ip(self), user.login, email, level=WARN)
             return self._json_error(400, "bad_request", "Invalid code")
 
-        user.is_active = True
-        user.email_confirmed_at = now
+        db.execute(update(User).where(User.id == user.id).values(is_active=True, email_confirmed_at=now))
         db.delete(auth_code)
         db.commit()
 
-        logger.write(f"[REGISTER CONFIRM] IP: {_client_ip(self)}, Login: {user.login}, Email: {email}")
+        logger.write("[REGISTER CONFIRM] IP: %s, Login: %s, Email: %s", _client_ip(self), user.login, email)
 
         return self._json_ok({"status": "confirmed"})
 
@@ -321,33 +428,31 @@ def auth_register_status(self, match, query):
     if not _validate_email(email):
         return self._json_error(400, "bad_request", "Invalid fields", {"email": "Invalid email"})
 
-    with SessionLocal() as db:
-        user = db.execute(select(User).where(User.email == email)).scalar_one_or_none()
+    with engine.connect() as conn:
+        user = conn.execute(_USER_BY_EMAIL_LOOKUP, {"e": email}).first()
         if not user:
             return self._json_error(404, "not_found", "User not found")
 
         if user.is_active:
             return self._json_ok({"status": "confirmed"})
 
-        auth_code = db.execute(
-            select(AuthCode).where(AuthCode.user_id == user.id, AuthCode.purpose == "email_confirm")
-        ).scalar_one_or_none()
+        auth_code = conn.execute(_CONFIRM_CODE_LOOKUP, {"u": user.id}).first()
 
-        now = _now_utc()
-        if not auth_code:
-            return self._json_ok({"status": "pending", "code": None})
+    now = _now_utc()
+    if not auth_code:
+        return self._json_ok({"status": "pending", "code": None})
 
-        ttl = max(0, int((auth_code.expires_at - now).total_seconds()))
-        return self._json_ok({
-            "status": "pending",
-            "code": {"send_count": auth_code.send_count, "input_count": auth_code.input_count, "ttl_sec": ttl}
-        })
+    ttl = max(0, int((auth_code.expires_at - now).total_seconds()))
+    return self._json_ok({
+        "status": "pending",
+        "code": {"send_count": auth_code.send_count, "input_count": auth_code.input_count, "ttl_sec": ttl}
+    })
 
 
 def _make_session(self, db, user: User, remember_me: bool, ip: str | None, ua: str | None):
     now = _now_utc()
     token = secrets.token_urlsafe(32)
-    token_hash = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    token_hash = _token_hash(token)
 
     session = DbSession(
         user_id=user.id,
@@ -377,23 +482,27 @@ def auth_login(self, match, query):
         return self._json_error(400, "bad_request", "Provide login or email and password")
 
     with SessionLocal() as db:
-        q = select(User)
+        # the handler only reads these; last_login_* are written without being loaded
+        q = select(User).options(load_only(User.id, User.is_active, User.password_hash))
         if login:
             q = q.where(User.login == login)
         else:
             q = q.where(User.email == email)
         user = db.execute(q).scalar_one_or_none()
         if not user:
-            logger.write(f"[LOGIN] Invalid credentials: IP: {_client_ip(self)}, Login: {login if login else None}, Email: {email if email else None}")
+            logger.write("[LOGIN] Invalid credentials: IP: %s, Login: %s, Email: %s", _client_ip(self), login or None, email or None, level=WARN)
             return self._json_error(401, "unauthorized", "Invalid credentials")
         if not user.is_active:
-            logger.write(f"[LOGIN] Email not confirmed: IP: {_client_ip(self)}, Login: {login if login else None}, Email: {email if email else None}")
+            logger.write("[LOGIN] Email not confirmed: IP: %s, Login: %s, Email: %s", _client_ip(self), login or None, email or None, level=WARN)
             return self._json_error(403, "forbidden", "Email not confirmed")
 
         if not _verify_password(password, user.password_hash):
-            logger.write(f"[LOGIN] Invalid password: IP: {_client_ip(self)}, Login: {login if login else None}, Email: {email if email else None}")
+            logger.write("[LOGIN] Invalid password: IP: %s, Login: %s, Email: %s", _client_ip(self), login or None, email or None, level=WARN)
             return self._json_error(401, "unauthorized", "Invalid credentials")
 
+        if _password_needs_rehash(user.password_hash):
+            user.password_hash = _hash_password(password)
+
         user.last_login_at = _now_utc()
         user.last_login_ip = self.client_address[0] if getattr(self, "client_address", None) else None
 
@@ -402,7 +511,7 @@ def auth_login(self, match, query):
             ip=user.last_login_ip, ua=self.headers.get("User-Agent")
         )
 
-        logger.write(f"[LOGIN] IP: {_client_ip(self)}, Login: {login if login else None}, Email: {email if email else None}")
+        logger.write("[LOGIN] IP: %s, Login: %s, Email: %s", _client_ip(self), login or None, email or None)
 
         return self._json_ok({
             "access_token": raw_token,
@@ -416,19 +525,19 @@ def auth_logout(self, match, query):
     if not token:
         return self._json_error(401, "unauthorized", "Missing bearer token")
 
-    token_hash = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    token_hash = _token_hash(token)
 
-    with SessionLocal() as db:
-        session = db.execute(select(DbSession).where(DbSession.session_hash == token_hash)).scalar_one_or_none()
+    with engine.begin() as conn:
+        session = conn.execute(_SESSION_LOOKUP, {"h": token_hash}).first()
         if not session:
             return self._json_error(401, "unauthorized", "Invalid session")
         if session.revoked_at is not None:
             return self._json_ok({"status": "already_revoked"})
 
-        session.revoked_at = _now_utc()
-        db.commit()
+        conn.execute(_SESSION_REVOKE, {"now": _now_utc(), "i": session.id})
+    _session_cache_drop(token_hash)
 
-        return self._json_ok({"status": "revoked"})
+    return self._json_ok({"status": "revoked"})
 
 
 def auth_whoami(self, match, query):
@@ -436,32 +545,35 @@ def auth_whoami(self, match, query):
     if not token:
         return self._json_error(401, "unauthorized", "Missing bearer token")
 
-    token_hash = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    token_hash = _token_hash(token)
     now = _now_utc()
 
-    with SessionLocal() as db:
-        session = db.execute(select(DbSession).where(DbSession.session_hash == token_hash)).scalar_one_or_none()
+    with engine.begin() as conn:
+        session = conn.execute(_SESSION_LOOKUP, {"h": token_hash}).first()
         if not session or session.revoked_at is not None or session.expires_at <= now:
             return self._json_error(401, "unauthorized", "Invalid session")
 
-        user = db.get(User, session.user_id)
+        user = conn.execute(_USER_PROFILE_LOOKUP, {"i": session.user_id}).first()
         if not user:
             return self._json_error(401, "unauthorized", "Invalid session")
 
-        session.last_seen_at = now
-        if ROLLING_TTL_ON_TOUCH:
-            session.expires_at = now + timedelta(days=SESSION_TTL_DAYS)
-        db.commit()
-
-        return self._json_ok({
-            "id": user.id,
-            "email": user.email,
-            "login": user.login,
-            "is_active": user.is_active,
-            "email_confirmed_at": user.email_confirmed_at.isoformat().replace("+00:00", "Z") if user.email_confirmed_at else None,
-            "last_login_at": user.last_login_at.isoformat().replace("+00:00", "Z") if user.last_login_at else None,
-            "last_login_ip": user.last_login_ip
-        })
+        if _touch_due(token_hash):
+            if ROLLING_TTL_ON_TOUCH:
+                conn.execute(_SESSION_TOUCH_ROLLING, {
+                    "now": now, "exp": now + timedelta(days=SESSION_TTL_DAYS), "i": session.id
+                })
+            else:
+                conn.execute(_SESSION_TOUCH, {"now": now, "i": session.id})
+
+    return self._json_ok({
+        "id": user.id,
+        "email": user.email,
+        "login": user.login,
+        "is_active": user.is_active,
+        "email_confirmed_at": user.email_confirmed_at.isoformat().replace("+00:00", "Z") if user.email_confirmed_at else None,
+        "last_login_at": user.last_login_at.isoformat().replace("+00:00", "Z") if user.last_login_at else None,
+        "last_login_ip": user.last_login_ip
+    })
 
 def auth_password_send_code(self, match, query):
     body = _parse_json_body(self) or {}
@@ -470,50 +582,21 @@ def auth_password_send_code(self, match, query):
         return self._json_error(400, "bad_request", "Invalid fields", {"email": "Invalid email"})
 
     with SessionLocal() as db:
-        user = db.execute(select(User).where(User.email == email)).scalar_one_or_none()
+        user = db.execute(select(User.id).where(User.email == email)).first()
         if not user:
             return self._json_error(404, "not_found", "User not found")
 
         now = _now_utc()
-        auth_code = db.execute(
-            select(AuthCode).where(AuthCode.user_id == user.id, AuthCode.purpose == "password_reset")
-        ).scalar_one_or_none()
-
-        if auth_code and auth_code.expires_at <= now:
-            db.delete(auth_code)
-            db.flush()
-            auth_code = None
-
         code = _gen_code(AUTH_CODE_LEN)
-        code_hash = _hash_code(code)
-        expires = now + timedelta(minutes=AUTH_CODE_TTL_MIN)
-
-        if auth_code is None:
-            auth_code = AuthCode(
-                user_id=user.id, purpose="password_reset",
-                code_hash=code_hash,
-                created_at=now, expires_at=expires,
-                send_count=1, last_sent_at=now,
-                input_count=0, last_input_at=None,
-            )
-            db.add(auth_code)
-        else:
-            if auth_code.send_count >= MAX_SEND_PER_CODE:
-                return self._json_error(
-                    429, "too_many_requests", "Resend limit reached",
-                    {"retry_after": int((auth_code.expires_at - now).total_seconds())}
-                )
-            auth_code.code_hash = code_hash
-            auth_code.created_at = now
-            auth_code.expires_at = expires
-            auth_code.send_count = auth_code.send_count + 1
-            auth_code.last_sent_at = now
-            auth_code.input_count = 0
-            auth_code.last_input_at = None
-
+        send_count = _upsert_auth_code(db, user.id, "password_reset", _hash_code(code), now)
+        if send_count is None:
+            retry_after = _auth_code_retry_after(db, user.id, "password_reset", now)
+            db.rollback()
+            return self._json_error(429, "too_many_requests", "Resend limit reached", {"retry_after": retry_after})
         db.commit()
+
         subject, mail_text, html = build_reset_email(code, AUTH_CODE_TTL_MIN)
-        send_email(email, subject, mail_text, html)
+        enqueue_email(email, subject, mail_text, html)
 
         return self._json_ok({"status": "sent", "code_ttl_sec": AUTH_CODE_TTL_MIN * 60})
 
@@ -534,7 +617,7 @@ def auth_password_reset(self, match, query):
         return self._json_error(400, "bad_request", "Invalid fields", errors)
 
     with SessionLocal() as db:
-        user = db.execute(select(User).where(User.email == email)).scalar_one_or_none()
+        user = db.execute(select(User.id, User.login, User.email).where(User.email == email)).first()
         if not user:
             return self._json_error(404, "not_found", "User not found")
 
@@ -558,23 +641,41 @@ def auth_password_reset(self, match, query):
         ac.input_count = ac.input_count + 1
         ac.last_input_at = now
 
-        if ac.code_hash != _hash_code(code):
+        if not _code_matches(ac.code_hash, code):
             db.commit()
             return self._json_error(400, "bad_request", "Invalid code")
 
-        user.password_hash = _hash_password(new_password)
-        active_sessions = db.execute(
-            select(DbSession).where(DbSession.user_id == user.id, DbSession.revoked_at.is_(None))
-        ).scalars().all()
-        for sess in active_sessions:
-            sess.revoked_at = now
+        db.execute(update(User).where(User.id == user.id).values(password_hash=_hash_password(new_password)))
+        db.execute(
+            update(DbSession)
+            .where(DbSession.user_id == user.id, DbSession.revoked_at.is_(None))
+            .values(revoked_at=now)
+        )
 
         db.delete(ac)
         db.commit()
-        logger.write(f"[PASSWORD RESET] IP: {_client_ip(self)}, Login: {user.login}, Email: {user.email}")
+        _session_cache_drop_user(user.id)
+        logger.write("[PASSWORD RESET] IP: %s, Login: %s, Email: %s", _client_ip(self), user.login, user.email)
         return self._json_ok({"status": "password_changed"})
 
 
+# Compile the hot lookups once at startup so the first request doesn't pay for it
+def warmup_auth_queries():
+    try:
+        with engine.connect() as conn:
+            conn.execute(_SESSION_LOOKUP, {"h": ""}).first()
+            conn.execute(_USER_LOOKUP, {"i": 0}).first()
+            conn.execute(_USER_PROFILE_LOOKUP, {"i": 0}).first()
+            conn.execute(_USER_BY_EMAIL_LOOKUP, {"e": ""}).first()
+            conn.execute(_CONFIRM_CODE_LOOKUP, {"u": 0}).first()
+            conn.execute(select(User.id, User.is_active).where(User.email == "")).first()
+            conn.execute(select(User.id, User.login, User.is_active).where(User.email == "")).first()
+            conn.execute(select(User.id, User.login, User.email).where(User.email == "")).first()
+            conn.execute(select(AuthCode).where(AuthCode.user_id == 0, AuthCode.purpose == "")).first()
+    except Exception as exception:
+        print(f"[AUTH] warmup skipped: {exception}")
+
+
 # Registration function into server
 def register_auth_endpoints(HandlerClass, routes_list):
     HandlerClass.auth_register = auth_register
@@ -610,17 +711,25 @@ def _auth_guard(self, handler_name: str):
     if not token:
         raise ApiError("Unauthorized", status=401, code="unauthorized")
 
-    token_hash = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    token_hash = _token_hash(token)
     now = _now_utc()
 
-    with SessionLocal() as db:
-        session = db.execute(select(DbSession).where(DbSession.session_hash == token_hash)).scalar_one_or_none()
+    cached = _session_cache_get(token_hash, now)
+    if cached is not None:
+        user_id, session_id, expires_at, _ = cached
+        self.auth_user = AuthUser(id=user_id, is_active=True)
+        self.auth_session = AuthSession(id=session_id, user_id=user_id, expires_at=expires_at)
+        return
+
+    with engine.connect() as conn:
+        session = conn.execute(_SESSION_LOOKUP, {"h": token_hash}).first()
         if not session or session.revoked_at is not None or session.expires_at <= now:
             raise ApiError("Unauthorized", status=401, code="unauthorized")
 
-        user = db.get(User, session.user_id)
+        user = conn.execute(_USER_LOOKUP, {"i": session.user_id}).first()
         if not user or not user.is_active:
             raise ApiError("Unauthorized", status=401, code="unauthorized")
 
-        self.auth_user = user
-        self.auth_session = session
\ No newline at end of file
+    _session_cache_put(token_hash, user.id, session.id, session.expires_at)
+    self.auth_user = AuthUser(id=user.id, is_active=user.is_active)
+    self.auth_session = AuthSession(id=session.id, user_id=session.user_id, expires_at=session.expires_at)
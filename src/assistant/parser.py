@@ -1,4 +1,8 @@
+import os
+import sys
+import signal
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 
 from sqlalchemy import select
@@ -8,89 +12,111 @@ from src.assistant.tg_parser import run_tg_cycle
 from src.db.db import SessionLocal
 from src.db.models.article import Article
 from src.db.models.article_stat import ArticleStat
-from src.utils.analyzer import analyze_article_words
-from src.utils.logger import Logger
+from src.utils.analyzer import analyze_articles_words
+from src.utils.logger import Logger, ERROR
 
 from src.utils.settings import get_setting_int
 from src.assistant.social_stats import run_social_stats_cycle
 
+POLL_MIN_INTERVAL_SEC = int(os.getenv("POLL_MIN_INTERVAL_SEC", "60"))
+
 _last_social_stats_at: datetime | None = None
 
 
-def _maybe_run_social_stats(logger) -> int:
+def _maybe_run_social_stats(logger, session=None) -> int:
     global _last_social_stats_at
     now = datetime.now(timezone.utc)
     interval_minutes = get_setting_int("social_stats_interval", 60)
     if _last_social_stats_at is None:
         _last_social_stats_at = now
-        return run_social_stats_cycle(logger)
+        return run_social_stats_cycle(logger, session)
 
     elapsed = (now - _last_social_stats_at).total_seconds()
     if elapsed >= interval_minutes * 60:
         _last_social_stats_at = now
-        return run_social_stats_cycle(logger)
+        return run_social_stats_cycle(logger, session)
     return 0
 
 logger = Logger("parser")
 
-def run_stats_cycle():
-    with SessionLocal() as session:
-        stmt = (
-            select(Article)
-            .outerjoin(
-                ArticleStat,
-                Article.id == ArticleStat.entity_id,
-            )
-            .where(ArticleStat.entity_id.is_(None))
-            .order_by(Article.id)
+def run_stats_cycle(session=None):
+    if session is None:
+        with SessionLocal() as session:
+            return run_stats_cycle(session)
+
+    stmt = (
+        select(Article.id, Article.title, Article.description)
+        .outerjoin(
+            ArticleStat,
+            Article.id == ArticleStat.entity_id,
         )
+        .where(ArticleStat.entity_id.is_(None))
+        .order_by(Article.id)
+    )
 
-        articles = session.execute(stmt).scalars().all()
-        if not articles:
-            return 0
+    articles = session.execute(stmt).all()
+    if not articles:
+        return 0
 
-        processed = 0
-        for article in articles:
-            try:
-                analyze_article_words(session, article.id)
-                processed += 1
-            except Exception as exception:
-                session.rollback()
-                logger.write(
-                    f"[STATS-ERROR] article_id={article.id} error={exception!r}"
-                )
+    # выбраны только статьи без ArticleStat — их анализ пишется пакетными INSERT
+    processed, failures = analyze_articles_words(session, articles, new_only=True)
+    for article_id, exception in failures:
+        logger.write(
+            f"[STATS-ERROR] article_id={article_id} error={exception!r}",
+            level=ERROR,
+        )
 
-        logger.write(f"[STATS] calculated for {processed} articles")
-        return processed
+    logger.write(f"[STATS] calculated for {processed} articles")
+    return processed
 
 def run_cycle():
     logger.ensure_log_dir()
     start = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
     logger.write(f"[CYCLE-START] {start}")
 
-    total_added = 0
-    total_added += run_vk_cycle(logger)
-    total_added += run_rss_cycle(logger)
-    total_added += run_tg_cycle(logger)
+    # источники независимы и упираются в сеть, поэтому опрашиваем их параллельно
+    with ThreadPoolExecutor(max_workers=3, thread_name_prefix="parser") as executor:
+        futures = {executor.submit(cycle, logger): cycle.__name__ for cycle in (run_vk_cycle, run_rss_cycle, run_tg_cycle)}
+        total_added = 0
+        for future in as_completed(futures):
+            # падение одного парсера не должно отменять счётчики остальных и проходы статистики
+            try:
+                total_added += future.result()
+            except Exception as exception:
+                logger.write(f"[ERROR] {futures[future]} failed: {exception}", level=ERROR)
 
-    stats_processed = run_stats_cycle()
-    social_stats_processed = _maybe_run_social_stats(logger)
+    # статистика и соц.метрики идут последовательно — им хватает одной сессии на двоих
+    with SessionLocal() as session:
+        stats_processed = run_stats_cycle(session)
+        session.commit()
+        social_stats_processed = _maybe_run_social_stats(logger, session)
 
     end = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
     logger.write(
         f"[CYCLE-END] {end} added={total_added} stats_processed={stats_processed} social_stats_processed={social_stats_processed}"
     )
+    return total_added
 
 def main():
+    # docker stop шлёт SIGTERM процессу с PID 1; SystemExit даёт atexit сбросить буферы логов
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
     logger.ensure_log_dir()
     logger.write("[PARSER] Parser started")
+    sleep_sec = None
     while True:
-        interval_minutes = max(1, get_setting_int("poll_interval", 5))
+        # poll_interval — верхняя граница; после цикла с новыми статьями опрашиваем чаще
+        max_sec = max(1, get_setting_int("poll_interval", 5)) * 60
+        min_sec = max(1, min(POLL_MIN_INTERVAL_SEC, max_sec))
+        added = 0
         try:
-            run_cycle()
+            added = run_cycle()
         except Exception as exception:
-            logger.write(f"[PARSER-ERROR] cycle failed: {exception}")
-        time.sleep(interval_minutes * 60)
+            logger.write(f"[PARSER-ERROR] cycle failed: {exception}", level=ERROR)
+        if added:
+            sleep_sec = min_sec
+        else:
+            sleep_sec = min((sleep_sec or max_sec) * 2, max_sec)
+        time.sleep(sleep_sec)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
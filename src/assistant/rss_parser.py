@@ -1,109 +1,189 @@
 import os
+import atexit
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from typing import Optional
 
 import httpx
 import feedparser
-from sqlalchemy import select, or_
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from src.db.db import SessionLocal
+from src.db.articles import existing_article_keys
 from src.db.models.source import Source
 from src.db.models.article import Article
+from src.utils.logger import WARN, ERROR
 
 FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "10.0"))
+RSS_FETCH_CONCURRENCY = int(os.getenv("RSS_FETCH_CONCURRENCY", "16"))
+
+DEFAULT_HEADERS = {
+    "User-Agent": "EditorAssistantBot (+https://localhost)",
+    "Accept": "application/rss+xml, application/xml;q=0.9, */*;q=0.8",
+}
+
+# общий клиент: соединения и TLS-сессии переиспользуются между лентами и циклами
+_CLIENT = httpx.Client(
+    timeout=FETCH_TIMEOUT,
+    follow_redirects=True,
+    http2=True,
+    headers=DEFAULT_HEADERS,
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+)
+atexit.register(_CLIENT.close)
+
+# source_id -> blake2b последнего обработанного тела ленты
+_LAST_FEED_DIGEST: dict[int, bytes] = {}
 
 def to_dt_utc(entry) -> Optional[datetime]:
-    parsed_time = getattr(entry, "published_parsed", None) or getattr(entry, "updated_parsed", None)
+    parsed_time = entry.get("published_parsed") or entry.get("updated_parsed")
     if not parsed_time:
         return None
     return datetime(*parsed_time[:6], tzinfo=timezone.utc)
 
-def fetch_bytes(url: str) -> bytes:
-    headers = {
-        "User-Agent": "EditorAssistantBot (+https://localhost)",
-        "Accept": "application/rss+xml, application/xml;q=0.9, */*;q=0.8",
-    }
-    with httpx.Client(timeout=FETCH_TIMEOUT, follow_redirects=True, headers=headers) as client:
-        response = client.get(url)
-        response.raise_for_status()
-        return response.content
-
-def process_source(session, source, logger) -> int:
-    added = 0
+def fetch_bytes(url: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    response = _CLIENT.get(url, headers=headers)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    return response.content, response.headers.get("ETag"), response.headers.get("Last-Modified")
+
+def fetch_source(source, logger):
     try:
-        raw = fetch_bytes(source.rss_url)
+        fetched = fetch_bytes(source.rss_url, source.http_etag, source.http_last_modified)
     except httpx.TimeoutException:
-        logger.write(f"[ERROR] Timeout fetching {source.rss_url}")
-        return 0
+        logger.write(f"[ERROR] Timeout fetching {source.rss_url}", level=ERROR)
+        return None
     except httpx.HTTPError as e:
-        logger.write(f"[ERROR] HTTP error for {source.rss_url}: {e}")
-        return 0
+        logger.write(f"[ERROR] HTTP error for {source.rss_url}: {e}", level=ERROR)
+        return None
     except Exception as e:
-        logger.write(f"[ERROR] Network error for {source.rss_url}: {e}")
-        return 0
+        logger.write(f"[ERROR] Network error for {source.rss_url}: {e}", level=ERROR)
+        return None
+    if fetched is None:
+        return None
+
+    raw, etag, last_modified = fetched
+    # лента без ETag/Last-Modified, но байты те же, что в прошлый раз — разбирать нечего
+    digest = hashlib.blake2b(raw, digest_size=16).digest()
+    if _LAST_FEED_DIGEST.get(source.id) == digest:
+        return None
 
-    parsed = feedparser.parse(raw)
+    # разбор идёт здесь же, в потоке загрузки, пока остальные потоки ждут сеть
+    try:
+        # sanitize_html остаётся включённым: description отдаётся клиентам как есть
+        parsed = feedparser.parse(raw, resolve_relative_uris=False)
+    except Exception as e:
+        logger.write(f"[ERROR] Feed parse failed for {source.rss_url}: {e}", level=ERROR)
+        return None
+    return parsed, etag, last_modified, digest
 
+def process_source(session, source, logger, parsed) -> int:
     if parsed.bozo and parsed.bozo_exception:
-        logger.write(f"[WARN] Feed parse issue for {source.rss_url}: {parsed.bozo_exception}")
+        logger.write(f"[WARN] Feed parse issue for {source.rss_url}: {parsed.bozo_exception}", level=WARN)
 
+    candidates = []
     for entry in parsed.entries:
-        title = getattr(entry, "title", "") or ""
-        link = getattr(entry, "link", "") or ""
-        guid = getattr(entry, "id", "") or getattr(entry, "guid", "") or link or title
-        description = getattr(entry, "description", "") or ""
-
-        published_at = to_dt_utc(entry)
+        # FeedParserDict: .get() идёт прямо в dict, getattr — через __getattr__ и перебор алиасов
+        title = entry.get("title") or ""
+        link = entry.get("link") or ""
+        guid = entry.get("id") or entry.get("guid") or link or title
 
         if not title or not link or not guid:
-            logger.write(f"[WARN] Skip incomplete item from {source.rss_url} (title/link/guid missing)")
+            logger.write(f"[WARN] Skip incomplete item from {source.rss_url} (title/link/guid missing)", level=WARN)
             continue
+        candidates.append((entry, title, link, guid))
 
-        exists = session.scalar(
-            select(Article.id)
-            .where(
-                (Article.source_id == source.id)
-                & (or_(Article.guid == guid, Article.link == link))
-            )
-            .limit(1)
-        )
-        if exists:
+    # один запрос на весь фид вместо SELECT на каждую запись
+    seen_guids, seen_links = existing_article_keys(
+        session, source.id, [c[3] for c in candidates], [c[2] for c in candidates]
+    )
+
+    now_utc = datetime.now(timezone.utc)
+    new_articles = []
+    for entry, title, link, guid in candidates:
+        if guid in seen_guids or link in seen_links:
             continue
+        seen_guids.add(guid)
+        seen_links.add(link)
+
+        new_articles.append({
+            "source_id": source.id,
+            "title": title,
+            "link": link,
+            "description": entry.get("description") or "",
+            "guid": guid,
+            "published_at": to_dt_utc(entry),
+            "fetched_at": now_utc,
+        })
+
+    if not new_articles:
+        return 0
+
+    source_name = source.name
+    # один INSERT на ленту; записи, вставленные параллельно, молча пропускаются по uq_article_guid/uq_article_link.
+    # ошибку не глотаем: вызывающий не должен сохранять валидаторы ленты, если вставка не прошла
+    titles = session.execute(
+        pg_insert(Article).values(new_articles).on_conflict_do_nothing().returning(Article.title)
+    ).scalars().all()
+    session.commit()
+    added = len(titles)
+    for title in titles:
+        logger.write(f"[ADD] Source={source_name!r} Title={title!r}")
+
+    return added
 
-        now_utc = datetime.now(timezone.utc)
-        article = Article(
-            source_id=source.id,
-            title=title,
-            link=link,
-            description=description,
-            guid=guid,
-            published_at=published_at,
-            fetched_at=now_utc,
-        )
+def _store_source(session, source, logger, parsed, etag, last_modified, digest) -> int:
+    try:
+        added = process_source(session, source, logger, parsed)
+    except Exception as e:
+        session.rollback()
+        logger.write(f"[ERROR] DB insert failed for source {source.name!r}: {e}", level=ERROR)
+        return 0
+
+    # digest и валидаторы фиксируются только после успешного commit статей: иначе следующий опрос
+    # сочтёт ленту неизменной (или получит 304) и записи из этой версии не будут вставлены никогда
+    _LAST_FEED_DIGEST[source.id] = digest
+    if etag != source.http_etag or last_modified != source.http_last_modified:
         try:
-            session.add(article)
-            added += 1
+            session.execute(
+                update(Source)
+                .where(Source.id == source.id)
+                .values(http_etag=etag, http_last_modified=last_modified)
+            )
             session.commit()
-            logger.write(f"[ADD] Source={source.name!r} Title={title!r}")
-        except IntegrityError:
-            session.rollback()
         except Exception as e:
             session.rollback()
-            logger.write(f"[ERROR] DB insert failed for source {source.name!r}: {e}")
-
+            logger.write(f"[ERROR] Failed to store HTTP validators for source {source.rss_url}: {e}", level=ERROR)
     return added
 
 def run_rss_cycle(logger) -> int:
     total_added = 0
     with SessionLocal() as session:
-        sources = session.execute(select(Source).where(Source.enabled == True)).scalars().all()
-        for source in sources:
-            if source.type != "rss" or not source.enabled:
-                continue
-            try:
-                total_added += process_source(session, source, logger)
-            except Exception as e:
-                logger.write(f"[ERROR] Unexpected error for source {source.rss_url}: {e}")
-
-    return total_added
\ No newline at end of file
+        sources = session.execute(
+            select(Source.id, Source.name, Source.rss_url, Source.http_etag, Source.http_last_modified)
+            .where(Source.enabled.is_(True), Source.type == "rss")
+        ).all()
+        if not sources:
+            return 0
+
+        # загрузка и разбор — параллельно, запись в БД — последовательно в этой сессии
+        workers = max(1, min(RSS_FETCH_CONCURRENCY, len(sources)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rss-fetch") as pool:
+            futures = [pool.submit(fetch_source, source, logger) for source in sources]
+            for source, future in zip(sources, futures):
+                fetched = future.result()
+                # None — ошибка сети/разбора, 304 Not Modified или неизменившееся тело
+                if fetched is None:
+                    continue
+                parsed, etag, last_modified, digest = fetched
+                total_added += _store_source(session, source, logger, parsed, etag, last_modified, digest)
+
+    return total_added
@@ -1,12 +1,16 @@
 import os
-import json
 import re
+import posixpath
+import socket
+import hashlib
+import orjson
 import zipfile
 import threading
+import time
 from datetime import datetime, timedelta, timezone
-from http.server import BaseHTTPRequestHandler, HTTPServer
-from urllib.parse import urlparse, parse_qs, quote
-from collections import deque, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+from collections import defaultdict
 
 from src.db.db import SessionLocal
 from src.db.models.source import Source
@@ -22,6 +26,7 @@ from src.db.models.article_social_stat import ArticleSocialStat
 from src.db.models.settings import Settings
 from sqlalchemy import select, func, delete, and_, or_
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from src.utils.slugifier import slugify_code
 from src.utils.analyzer import analyze_article_words, analyze_all_articles
@@ -31,14 +36,18 @@ from dataclasses import dataclass, field
 from typing import Any, Dict, Optional
 
 from pathlib import Path
+from functools import lru_cache
 import mimetypes
 from urllib.parse import unquote
 
 from src.assistant.tg_auth import start_qr_sync, status_sync, submit_password_sync, logout_sync
 
-from src.assistant.auth import register_auth_endpoints
+from src.assistant.auth import register_auth_endpoints, warmup_auth_queries
 
 MEDIA_DIR = os.path.abspath(os.getenv("MEDIA_DIR", "./media"))
+# resolve() — это realpath с syscalls; для корня медиа делаем его один раз
+_MEDIA_ROOT = Path(MEDIA_DIR).resolve()
+_MEDIA_ROOT_PREFIX = str(_MEDIA_ROOT).rstrip(os.sep) + os.sep
 
 _recompute_lock = threading.Lock()
 
@@ -58,11 +67,47 @@ def _enqueue_words_recompute():
     thread.start()
 
 def _safe_join(base: str, *parts: str) -> Path:
-    base_path = Path(base).resolve()
-    full = base_path.joinpath(*parts).resolve()
-    if not str(full).startswith(str(base_path)):
+    # строковые os.path вместо pathlib; Path собирается один раз для результата
+    if base == MEDIA_DIR:
+        root, prefix = str(_MEDIA_ROOT), _MEDIA_ROOT_PREFIX
+    else:
+        root = os.path.realpath(base)
+        prefix = root.rstrip(os.sep) + os.sep
+    full = os.path.realpath(os.path.join(root, *parts))
+    if full != root and not full.startswith(prefix):
         raise ValueError("Unsafe path")
-    return full
+    return Path(full)
+
+@lru_cache(maxsize=256)
+def _mime_for_suffix(suffix: str) -> Optional[str]:
+    # тип зависит только от расширения, реестр mimetypes обходим один раз на расширение
+    return mimetypes.guess_type("file" + suffix)[0]
+
+# Range: bytes=first-last (одиночный диапазон); всё остальное отдаётся целым файлом
+_RANGE_MATCH = re.compile(r"bytes=(\d*)-(\d*)").fullmatch
+
+_IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+def _image_assets(found_dir: Path, *parts: str) -> list[dict]:
+    # URL строится из тех же частей, из которых _safe_join собрал found_dir, а не из resolve()-пути:
+    # так он не зависит от симлинков в MEDIA_DIR
+    rel_dir = posixpath.normpath("/".join(parts))
+    # scandir отдаёт тип файла из d_type; stat нужен только для симлинков, которые, как и раньше, включаются
+    with os.scandir(found_dir) as entries:
+        files = sorted(entry.name for entry in entries if entry.name != "media.json" and entry.is_file())
+    assets = []
+    for name in files:
+        suffix = os.path.splitext(name)[1].lower()
+        mime = _mime_for_suffix(suffix)
+        if not (mime or "").startswith("image/") and suffix not in _IMAGE_EXTS:
+            continue
+        assets.append({
+            "type": "image",
+            "file_url": f"/media/{rel_dir}/{name}",
+            "mime": mime or "application/octet-stream",
+            "name": name,
+        })
+    return assets
 
 
 class _StreamingWriter:
@@ -78,14 +123,85 @@ class _StreamingWriter:
         self._raw.flush()
 
 # -------- утилиты JSON --------
+# datetime сериализуется нативно: секунды без микросекунд, UTC как "Z", naive считаем UTC
+_JSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NAIVE_UTC | orjson.OPT_OMIT_MICROSECONDS | orjson.OPT_NON_STR_KEYS
+
 def json_bytes(data) -> bytes:
-    def _default(value):
-        if isinstance(value, datetime):
-            dt = value if value.tzinfo is not None else value.replace(tzinfo = timezone.utc)
-            s = dt.isoformat(timespec="seconds")
-            return s[:-6] + "Z" if s.endswith("+00:00") else s
-        return str(value)
-    return json.dumps(data, ensure_ascii=False, default=_default).encode("utf-8")
+    return orjson.dumps(data, default=str, option=_JSON_OPTIONS)
+
+# неизменяемые запросы справочников собираются один раз, а не на каждый запрос
+# колонки перечислены явно: строки идут в ответ через .mappings() без сборки ORM-объектов
+_LIST_SOURCES_STMT = (
+    select(Source.id, Source.name, Source.type, Source.rss_url, Source.enabled, Source.created_at)
+    .order_by(Source.id)
+)
+_LIST_KEY_WORDS_STMT = select(KeyWord.id, KeyWord.code, KeyWord.value, KeyWord.rubric_id).order_by(KeyWord.id)
+_LIST_STOP_WORDS_STMT = select(StopWord.id, StopWord.code, StopWord.value, StopWord.category_id).order_by(StopWord.id)
+_LIST_RUBRICS_STMT = select(Rubric.id, Rubric.code, Rubric.title).order_by(Rubric.id)
+_LIST_STOP_CATEGORIES_STMT = (
+    select(StopCategory.id, StopCategory.code, StopCategory.title)
+    .where(StopCategory.is_active.is_(True))
+    .order_by(StopCategory.id)
+)
+
+# поля статьи в ответах get_article/get_article_children, без ORM-объектов
+_ARTICLE_COLUMNS = (
+    Article.id, Article.source_id, Article.title, Article.link, Article.description,
+    Article.guid, Article.published_at, Article.fetched_at, Article.parent_article_id,
+)
+
+_HEALTHZ_BODY = b"OK\n"
+_ROOT_BODY = b"Editor Assistant backend is running\n"
+# неизменная часть CORS-заголовков, дописывается к каждому ответу _send
+_CORS_ANY_ORIGIN = b"Access-Control-Allow-Origin: *\r\n"
+_CORS_TAIL = (
+    b"Access-Control-Expose-Headers: Content-Disposition, ETag\r\n"
+    b"Access-Control-Allow-Headers: Content-Type, Authorization\r\n"
+    b"Access-Control-Allow-Methods: GET,POST,PUT,PATCH,DELETE,OPTIONS\r\n"
+    b"\r\n"
+)
+
+# http(s)-адрес источника без пробелов; проверка одним вызовом C-кода
+_HTTP_URL_MATCH = re.compile(r"https?://\S+").fullmatch
+_BULK_SOURCES_MAX = 1000
+
+def _source_errors(name: str, rss_url: str) -> Optional[dict]:
+    if name and _HTTP_URL_MATCH(rss_url):
+        return None
+    # dict ошибок собирается только для невалидного запроса
+    errors = {}
+    if not name:
+        errors["name"] = "Required"
+    if not _HTTP_URL_MATCH(rss_url):
+        errors["rss_url"] = "Must be valid http(s) URL"
+    return errors
+
+def _source_type(rss_url: str) -> str:
+    if "vk.com" in rss_url:
+        return "vk"
+    if "t.me" in rss_url or "telegram.me" in rss_url:
+        return "tg"
+    return "rss"
+
+# (code, message) -> тело ошибки с %s на месте request_id; сообщения почти всегда константы
+_ERROR_TEMPLATES: dict[tuple[str, str], bytes] = {}
+_ERROR_TEMPLATES_MAX = 256
+
+def _error_template(code: str, message: str) -> bytes:
+    template = _ERROR_TEMPLATES.get((code, message))
+    if template is None:
+        body = json_bytes({"error": {"code": code, "message": message, "request_id": "\x01"}})
+        template = body.replace(b"%", b"%%").replace(b"\\u0001", b"%s")
+        if len(_ERROR_TEMPLATES) < _ERROR_TEMPLATES_MAX:
+            _ERROR_TEMPLATES[(code, message)] = template
+    return template
+
+def _etag_matches(if_none_match: Optional[str], tag: str) -> bool:
+    # If-None-Match сравнивается слабо: W/ у тегов не учитывается
+    if not if_none_match:
+        return False
+    tags = {value.strip().removeprefix("W/") for value in if_none_match.split(",")}
+    return "*" in tags or tag.removeprefix("W/") in tags
 
 def parse_json_body(handler: BaseHTTPRequestHandler):
     length = int(handler.headers.get("Content-Length", 0) or 0)
@@ -93,7 +209,7 @@ def parse_json_body(handler: BaseHTTPRequestHandler):
         return None
     raw = handler.rfile.read(length)
     try:
-        return json.loads(raw.decode("utf-8"))
+        return orjson.loads(raw)
     except Exception:
         raise ValidationError("Invalid JSON body")
 
@@ -157,21 +273,91 @@ READ_TIMEOUT_SEC = int(os.getenv("READ_TIMEOUT_SEC", "15"))
 RATE_LIMIT = int(os.getenv("RATE_LIMIT", "60"))         # запросов
 RATE_WINDOW = int(os.getenv("RATE_WINDOW", "60"))       # секунд
 
-# очередь временных меток на каждый key (ip)
-_rate_buckets = defaultdict(lambda: deque())
+RATE_GC_INTERVAL_SEC = 60
+
+# token bucket на каждый key (ip): [доступные токены, время последнего пополнения (monotonic)]
+_rate_buckets: dict[str, list[float]] = {}
+_rate_lock = threading.Lock()
+_rate_last_gc = time.monotonic()
+
+def _rate_gc(now: float):
+    # за окно бездействия ведро всё равно наполнилось бы целиком — такие ip можно забыть
+    idle_since = now - RATE_WINDOW
+    for key in [key for key, bucket in _rate_buckets.items() if bucket[1] < idle_since]:
+        del _rate_buckets[key]
 
 def _rate_check(ip: str):
+    global _rate_last_gc
     if RATE_LIMIT <= 0:
         return  # лимит отключен
-    now = datetime.now(timezone.utc)
-    win_start = now - timedelta(seconds=RATE_WINDOW)
-    dq = _rate_buckets[ip]
-    # очистим старые записи
-    while dq and dq[0] < win_start:
-        dq.popleft()
-    if len(dq) >= RATE_LIMIT:
-        raise TooManyRequests(f"Too many requests: limit {RATE_LIMIT} per {RATE_WINDOW}s")
-    dq.append(now)
+    now = time.monotonic()
+    with _rate_lock:
+        if now - _rate_last_gc >= RATE_GC_INTERVAL_SEC:
+            _rate_gc(now)
+            _rate_last_gc = now
+        bucket = _rate_buckets.get(ip)
+        if bucket is None:
+            bucket = _rate_buckets[ip] = [float(RATE_LIMIT), now]
+        else:
+            bucket[0] = min(float(RATE_LIMIT), bucket[0] + (now - bucket[1]) * RATE_LIMIT / RATE_WINDOW)
+            bucket[1] = now
+        if bucket[0] < 1.0:
+            raise TooManyRequests(f"Too many requests: limit {RATE_LIMIT} per {RATE_WINDOW}s")
+        bucket[0] -= 1.0
+
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "128"))
+_PID = os.getpid()
+ACCESS_LOG = os.getenv("ACCESS_LOG", "true").lower() == "true"
+
+class _ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # у socketserver по умолчанию listen(5): всплеск соединений получает отказ раньше, чем до них дойдут потоки
+    request_queue_size = SERVER_BACKLOG
+
+_REGEX_META = set("\\.^$*+?()[]{}|")
+
+class _IdMatch:
+    # заменяет re.Match для маршрутов вида /prefix/(\d+)/suffix: хэндлеры читают match.group(1)
+    __slots__ = ("value",)
+
+    def __init__(self, value: str):
+        self.value = value
+
+    def group(self, index=1):
+        return self.value
+
+def _is_literal(pattern: str) -> bool:
+    return not _REGEX_META & set(pattern)
+
+def _index_routes(routes) -> tuple[dict, dict, dict]:
+    # литеральные пути — в dict, пути с одним (\d+) — в (prefix, suffix) без регэкспов,
+    # остальные регэкспы — по методу в одну альтернацию
+    static, by_id, by_method = {}, {}, {}
+    for method, regex, name in routes:
+        pattern = regex.pattern
+        if pattern.startswith("^") and pattern.endswith("$"):
+            body = pattern[1:-1]
+            prefix, sep, suffix = body.partition(r"(\d+)")
+            if not sep and _is_literal(body):
+                static.setdefault((method, body), name)
+                continue
+            if sep and _is_literal(prefix) and _is_literal(suffix):
+                by_id.setdefault(method, []).append((prefix, suffix, name))
+                continue
+        by_method.setdefault(method, []).append((regex, name))
+    combined = {
+        method: (re.compile("|".join(f"(?P<r{i}>{regex.pattern})" for i, (regex, _) in enumerate(items))), items)
+        for method, items in by_method.items()
+    }
+    return static, by_id, combined
+
+def _match_id_route(items, path: str):
+    for prefix, suffix, name in items:
+        if path.startswith(prefix) and path.endswith(suffix):
+            value = path[len(prefix):len(path) - len(suffix)]
+            if value.isdecimal():
+                return name, _IdMatch(value)
+    return None, None
 
 # ---- Хэндлер ----
 def run_server(host: str = "0.0.0.0", port: int = 8000):
@@ -183,6 +369,7 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
             # sources
             ("GET",  re.compile(r"^/api/sources$"),           "list_sources"),
             ("POST", re.compile(r"^/api/sources$"),           "create_source"),
+            ("POST", re.compile(r"^/api/sources/bulk$"),      "bulk_create_sources"),
             ("DELETE", re.compile(r"^/api/sources/(\d+)$"),   "delete_source"),
             # articles
             ("GET",  re.compile(r"^/api/articles$"),          "list_articles"),
@@ -230,6 +417,15 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
             ("GET", re.compile(r"^/api/articles/(\d+)/key-words$"), "get_article_key_words"),
         ]
 
+        # (method, path) -> handler для маршрутов без параметров
+        static_routes: dict[tuple[str, str], str] = {}
+        # method -> [(prefix, suffix, handler)] для маршрутов с одним числовым id
+        id_routes: dict[str, list] = {}
+        # method -> (общий регэксп, [(regex, handler)]) для остальных маршрутов с параметрами
+        param_routes: dict[str, tuple] = {}
+        # handler -> функция класса, чтобы не делать getattr и не создавать bound method на запрос
+        handler_table: dict[str, Any] = {}
+
         def do_GET(self): self._dispatch("GET")
         def do_POST(self): self._dispatch("POST")
         def do_DELETE(self): self._dispatch("DELETE")
@@ -238,6 +434,8 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
             super().setup()
             try:
                 self.connection.settimeout(READ_TIMEOUT_SEC)
+                # ответ уходит одним write, ждать досылки по Nagle незачем
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             except Exception:
                 pass
 
@@ -248,45 +446,62 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
             except ApiError as error:
                 return self._json_error(error.status, error.code, str(error))
 
-            parsed = urlparse(self.path)
-            path = parsed.path
-            for http_method, regex, handler_name in self.routes:
-                if http_method == method:
+            if self.path.startswith("/"):
+                path, _, query_string = self.path.partition("#")[0].partition("?")
+            else:
+                # absolute-form (http://host/path) или мусор: разбираем полноценно
+                parts = urlsplit(self.path)
+                path, query_string = parts.path or "/", parts.query
+            match = None
+            handler_name = self.static_routes.get((method, path))
+            if handler_name is None and method in self.id_routes:
+                handler_name, match = _match_id_route(self.id_routes[method], path)
+            if handler_name is None and method in self.param_routes:
+                combined, items = self.param_routes[method]
+                hit = combined.match(path)
+                if hit:
+                    # группы хэндлеры читают по номеру, поэтому совпавший маршрут матчим ещё раз сам по себе
+                    regex, handler_name = items[int(hit.lastgroup[1:])]
                     match = regex.match(path)
-                    if match:
-                        try:
-                            handler = getattr(self, handler_name)
-                            if hasattr(self, "_auth_guard"):
-                                self._auth_guard(handler_name)
-                            return handler(match, parse_qs(parsed.query))
-                        except ApiError as error:
-                            return self._json_error(error.status, error.code, str(error), error.details)
-                        except IntegrityError as error:
-                            return self._json_error(409, "conflict", "Database constraint violation", {"detail": str(error.orig)})
-                        except TimeoutError as error:
-                            print(f"[TIMEOUT] {method} {path}: {error}")
-                            return self._json_error(504, "gateway_timeout", "Telegram authorization timed out")
-                        except Exception as error:
-                            print(f"[ERROR] {method} {path}: {error}")
-                            return self._json_error(500, "internal_error", "Internal server error")
-            return self._json_error(405, "method_not_allowed", "Method not allowed")
+            if handler_name is None:
+                return self._json_error(405, "method_not_allowed", "Method not allowed")
+
+            try:
+                if hasattr(self, "_auth_guard"):
+                    self._auth_guard(handler_name)
+                return self.handler_table[handler_name](self, match, parse_qs(query_string) if query_string else {})
+            except ApiError as error:
+                return self._json_error(error.status, error.code, str(error), error.details)
+            except IntegrityError as error:
+                return self._json_error(409, "conflict", "Database constraint violation", {"detail": str(error.orig)})
+            except TimeoutError as error:
+                print(f"[TIMEOUT] {method} {path}: {error}")
+                return self._json_error(504, "gateway_timeout", "Telegram authorization timed out")
+            except Exception as error:
+                print(f"[ERROR] {method} {path}: {error}")
+                return self._json_error(500, "internal_error", "Internal server error")
 
         # ---- Ответы ----
-        def _send(self, code: int, body: bytes, ctype: str):
-            self.send_response(code)
-            self.send_header("Content-Type", ctype)
-            self.send_header("Content-Length", str(len(body)))
+        def _send(self, code: int, body: bytes, ctype: str, extra_headers: bytes = b""):
+            # статус, заголовки и тело собираются в один буфер и уходят одним write
+            self.log_request(code)
             origin = self.headers.get("Origin")
-            if origin:
-                self.send_header("Access-Control-Allow-Origin", origin if origin != "null" else "*")
-                self.send_header("Vary", "Origin")
+            if origin and origin != "null":
+                cors = b"Access-Control-Allow-Origin: %s\r\nVary: Origin\r\n" % origin.encode("latin-1", "replace")
+            elif origin:
+                cors = _CORS_ANY_ORIGIN + b"Vary: Origin\r\n"
             else:
-                self.send_header("Access-Control-Allow-Origin", "*")
-            self.send_header("Access-Control-Expose-Headers", "Content-Disposition")
-            self.send_header("Access-Control-Allow-Headers", "Content-Type, Authorization")
-            self.send_header("Access-Control-Allow-Methods", "GET,POST,PUT,PATCH,DELETE,OPTIONS")
-            self.end_headers()
-            self.wfile.write(body)
+                cors = _CORS_ANY_ORIGIN
+            head = "%s %d %s\r\nServer: %s\r\nDate: %s\r\nContent-Type: %s\r\nContent-Length: %d\r\n" % (
+                self.protocol_version,
+                code,
+                self.responses.get(code, ("",))[0],
+                self.version_string(),
+                self.date_time_string(),
+                ctype,
+                len(body),
+            )
+            self.wfile.write(b"".join((head.encode("latin-1"), extra_headers, cors, _CORS_TAIL, body)))
 
         def _send_cors_headers(self):
             origin = self.headers.get("Origin")
@@ -315,15 +530,30 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
             except (ConnectionResetError, BrokenPipeError):
                 return
 
-        def _json_ok(self, payload, status=200):
-            self._send(status, json_bytes(payload), "application/json; charset=utf-8")
+        def _json_ok(self, payload, status=200, etag=False):
+            body = json_bytes(payload)
+            if not etag:
+                return self._send(status, body, "application/json; charset=utf-8")
+            # слабый ETag по хешу тела: повторный запрос с If-None-Match получает 304 без тела
+            tag = 'W/"%s"' % hashlib.blake2b(body, digest_size=8).hexdigest()
+            header = b"ETag: %s\r\n" % tag.encode()
+            if _etag_matches(self.headers.get("If-None-Match"), tag):
+                return self._send(304, b"", "application/json; charset=utf-8", header)
+            self._send(status, body, "application/json; charset=utf-8", header)
 
         def _json_error(self, status, code, message, details=None):
-            req_id = f"{int(datetime.now(timezone.utc).timestamp())}-{os.getpid()}"
-            payload = {"error": {"code": code, "message": message, "request_id": req_id}}
+            req_id = f"{time.time_ns() // 1_000_000_000}-{_PID}"
             if details:
-                payload["error"]["details"] = details
-            self._send(status, json_bytes(payload), "application/json; charset=utf-8")
+                payload = {"error": {"code": code, "message": message, "request_id": req_id, "details": details}}
+                body = json_bytes(payload)
+            else:
+                body = _error_template(code, message) % req_id.encode()
+            self._send(status, body, "application/json; charset=utf-8")
+
+        def log_request(self, code="-", size="-"):
+            # access-лог выключен — не собираем строку вовсе
+            if ACCESS_LOG:
+                super().log_request(code, size)
 
         def log_message(self, fmt, *args):
             method = getattr(self, "command", "-")
@@ -332,19 +562,16 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
 
         # ---- Handlers ----
         def healthz(self, match, query):
-            self._send(200, b"OK\n", "text/plain; charset=utf-8")
+            self._send(200, _HEALTHZ_BODY, "text/plain; charset=utf-8")
 
         def root(self, match, query):
-            self._send(200, b"Editor Assistant backend is running\n", "text/plain; charset=utf-8")
+            self._send(200, _ROOT_BODY, "text/plain; charset=utf-8")
 
         # ---- Sources ----
         def list_sources(self, match, query):
             with SessionLocal() as session:
-                rows = session.execute(select(Source).order_by(Source.id)).scalars().all()
-                self._json_ok([{
-                    "id": r.id, "name": r.name, "type": r.type, "rss_url": r.rss_url,
-                    "enabled": r.enabled, "created_at": r.created_at
-                } for r in rows])
+                rows = session.execute(_LIST_SOURCES_STMT).mappings().all()
+                self._json_ok([dict(r) for r in rows], etag=True)
 
         def create_source(self, match, query):
             body = parse_json_body(self) or {}
@@ -352,32 +579,63 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
             rss_url = (body.get("rss_url") or "").strip()
             enabled = bool(body.get("enabled", True))
 
-            errors = {}
-            if not name:
-                errors["name"] = "Required"
-            if not rss_url or not (rss_url.startswith("http://") or rss_url.startswith("https://")):
-                errors["rss_url"] = "Must be valid http(s) URL"
+            errors = _source_errors(name, rss_url)
             if errors:
                 raise ValidationError("Invalid fields", details=errors)
-
-            if "vk.com" in rss_url:
-                source_type = "vk"
-            elif "t.me" in rss_url or "telegram.me" in rss_url:
-                source_type = "tg"
-            else:
-                source_type = "rss"
-
+            source_type = _source_type(rss_url)
+
+            # INSERT ... RETURNING отдаёт id сразу, без session.refresh вторым запросом
+            created_at = datetime.now(timezone.utc)
+            stmt = (
+                pg_insert(Source)
+                .values(name=name, type=source_type, rss_url=rss_url, enabled=enabled, created_at=created_at)
+                .returning(Source.id)
+            )
             with SessionLocal() as session:
                 try:
-                    obj = Source(name=name, type=source_type, rss_url=rss_url, enabled=enabled)
-                    session.add(obj)
+                    source_id = session.execute(stmt).scalar_one()
                     session.commit()
-                    session.refresh(obj)
                 except IntegrityError as error:
                     session.rollback()
                     raise Conflict("rss_url already exists")
-                self._json_ok({"id": obj.id, "name": obj.name, "type": obj.type, "rss_url": obj.rss_url,
-                               "enabled": obj.enabled, "created_at": obj.created_at}, status=201)
+            self._json_ok({"id": source_id, "name": name, "type": source_type, "rss_url": rss_url,
+                           "enabled": enabled, "created_at": created_at}, status=201)
+
+        def bulk_create_sources(self, match, query):
+            body = parse_json_body(self)
+            if not isinstance(body, list) or not body:
+                raise ValidationError("Expected non-empty JSON array of sources")
+            if len(body) > _BULK_SOURCES_MAX:
+                raise ValidationError(f"At most {_BULK_SOURCES_MAX} sources per request")
+
+            now = datetime.now(timezone.utc)
+            rows, errors = [], {}
+            for index, item in enumerate(body):
+                if not isinstance(item, dict):
+                    errors[index] = {"item": "Must be an object"}
+                    continue
+                name = (item.get("name") or "").strip()
+                rss_url = (item.get("rss_url") or "").strip()
+                item_errors = _source_errors(name, rss_url)
+                if item_errors:
+                    errors[index] = item_errors
+                    continue
+                rows.append({"name": name, "type": _source_type(rss_url), "rss_url": rss_url,
+                             "enabled": bool(item.get("enabled", True)), "created_at": now})
+            if errors:
+                raise ValidationError("Invalid fields", details=errors)
+
+            # один INSERT ... VALUES (...), (...) на всю пачку; уже существующие rss_url пропускаются
+            stmt = (
+                pg_insert(Source)
+                .values(rows)
+                .on_conflict_do_nothing(index_elements=[Source.rss_url])
+                .returning(Source.id, Source.name, Source.type, Source.rss_url, Source.enabled, Source.created_at)
+            )
+            with SessionLocal() as session:
+                created = [dict(r) for r in session.execute(stmt).mappings().all()]
+                session.commit()
+            self._json_ok({"created": created, "skipped": len(rows) - len(created)}, status=201)
 
         def delete_source(self, match, query):
             source_id = int(match.group(1))
@@ -460,7 +718,14 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
 
             with SessionLocal() as session:
                 stmt = (
-                    select(Article, Source.name, ArticleStat.key_words_count, Rubric.title, ArticleSocialStat.is_trending)
+                    select(
+                        Article.id, Article.source_id, Source.name.label("source_name"),
+                        Article.title, Article.link, Article.description, Article.guid,
+                        Article.published_at, Article.fetched_at, Article.parent_article_id,
+                        Rubric.title.label("rubric_title"),
+                        func.coalesce(ArticleStat.key_words_count, 0).label("key_words_count"),
+                        func.coalesce(ArticleSocialStat.is_trending, False).label("is_trending"),
+                    )
                     .join(Source, Source.id == Article.source_id)
                     .outerjoin(ArticleStat, ArticleStat.entity_id == Article.id)
                     .outerjoin(Rubric, Rubric.id == ArticleStat.rubric_id)
@@ -471,8 +736,9 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
                     stmt = stmt.where(Article.source_id == source_id)
 
                 if text_q:
+                    # подстрочный поиск; ILIKE '%q%' обслуживают trigram-индексы ix_articles_*_trgm
                     ilike = f"%{text_q}%"
-                    stmt = stmt.where((Article.title.ilike(ilike)) | (Article.description.ilike(ilike)))
+                    stmt = stmt.where(or_(Article.title.ilike(ilike), Article.description.ilike(ilike)))
 
                 if dt_from:
                     stmt = stmt.where(Article.published_at >= dt_from)
@@ -502,7 +768,7 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
                         )
                     )
 
-                total = session.scalar(select(func.count()).select_from(stmt.subquery())) or 0
+                count_stmt = stmt
 
                 if relevance_sort == "asc":
                     stmt = stmt.order_by(ArticleStat.key_words_count.asc().nulls_first())
@@ -520,44 +786,33 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
                         Article.id.desc(),
                     )
 
-                rows = session.execute(stmt.limit(limit).offset(offset)).all()
+                # total считается оконной функцией в том же запросе, что и страница
+                result = session.execute(
+                    stmt.add_columns(func.count().over().label("total")).limit(limit).offset(offset)
+                )
+                # total — последняя колонка; zip по ключам без неё сразу даёт элемент ответа
+                keys = list(result.keys())[:-1]
+                rows = result.all()
+                if rows:
+                    total = rows[0][-1]
+                elif offset == 0:
+                    total = 0
+                else:
+                    # страница за концом выборки — окно пустое, считаем отдельно
+                    total = session.scalar(select(func.count()).select_from(count_stmt.subquery())) or 0
 
                 self._json_ok({
                     "total": total, "limit": limit, "offset": offset,
-                    "items": [{
-                        "id": article.id,
-                        "source_id": article.source_id,
-                        "source_name": source_name,
-                        "title": article.title,
-                        "link": article.link,
-                        "description": article.description,
-                        "guid": article.guid,
-                        "published_at": article.published_at,
-                        "fetched_at": article.fetched_at,
-                        "parent_article_id": article.parent_article_id,
-                        "rubric_title": rubric_title,
-                        "key_words_count": key_words_count if key_words_count is not None else 0,
-                        "is_trending": bool(is_trending) if is_trending is not None else False,
-                    } for article, source_name, key_words_count, rubric_title, is_trending in rows]
+                    "items": [dict(zip(keys, row)) for row in rows],
                 })
 
         def get_article(self, match, query):
             article_id = int(match.group(1))
             with SessionLocal() as session:
-                article = session.get(Article, article_id)
-                if not article:
-                    raise NotFound("Article not found")
-                self._json_ok({
-                    "id": article.id,
-                    "source_id": article.source_id,
-                    "title": article.title,
-                    "link": article.link,
-                    "description": article.description,
-                    "guid": article.guid,
-                    "published_at": article.published_at,
-                    "fetched_at": article.fetched_at,
-                    "parent_article_id": article.parent_article_id
-                })
+                row = session.execute(select(*_ARTICLE_COLUMNS).where(Article.id == article_id)).mappings().first()
+            if not row:
+                raise NotFound("Article not found")
+            self._json_ok(dict(row), etag=True)
 
         def export_articles(self, match, query):
             from openpyxl import Workbook
@@ -650,7 +905,7 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
                 ])
 
             def _is_image_file(path: Path) -> bool:
-                mime, _ = mimetypes.guess_type(path.name)
+                mime = _mime_for_suffix(path.suffix.lower())
                 if (mime or "").startswith("image/"):
                     return True
                 return path.suffix.lower() in {".jpg", ".jpeg", ".png", ".gif", ".webp"}
@@ -783,7 +1038,6 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
                     raise NotFound("Article not found")
 
                 assets = []
-                image_exts = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
 
                 try:
                     if article.guid and article.guid.startswith("vk:"):
@@ -795,22 +1049,7 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
                             found_dir = dir
 
                         if found_dir:
-                            for path in sorted(found_dir.iterdir()):
-                                if not path.is_file():
-                                    continue
-                                if path.name == "media.json":
-                                    continue
-                                rel = path.relative_to(Path(MEDIA_DIR)).as_posix()
-                                file_url = f"/media/{rel}"
-                                mime, _ = mimetypes.guess_type(path.name)
-                                if not (mime or "").startswith("image/") and path.suffix.lower() not in image_exts:
-                                    continue
-                                assets.append({
-                                    "type": "image",
-                                    "file_url": file_url,
-                                    "mime": mime or "application/octet-stream",
-                                    "name": path.name,
-                                })
+                            assets = _image_assets(found_dir, "vk", owner_str, post_str)
                     elif article.guid and article.guid.startswith("tg:"):
                         _, channel, msg_id = article.guid.split(":", 2)
                         found_dir = None
@@ -819,18 +1058,7 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
                             found_dir = dir
 
                         if found_dir:
-                            for path in sorted(found_dir.iterdir()):
-                                if path.is_file() and path.name != "media.json":
-                                    rel = path.relative_to(Path(MEDIA_DIR)).as_posix()
-                                    mime, _ = mimetypes.guess_type(path.name)
-                                    if not (mime or "").startswith("image/") and path.suffix.lower() not in image_exts:
-                                        continue
-                                    assets.append({
-                                        "type": "image",
-                                        "file_url": f"/media/{rel}",
-                                        "mime": mime or "application/octet-stream",
-                                        "name": path.name,
-                                    })
+                            assets = _image_assets(found_dir, "tg", channel, msg_id)
 
                 except Exception as exception:
                     print(f"[ERROR] assets for article {article_id}: {exception}")
@@ -843,36 +1071,32 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
             offset = max(0, int(query.get("offset", [0])[0]))
 
             with SessionLocal() as session:
-                parent = session.get(Article, article_id)
-                if not parent:
+                if session.scalar(select(Article.id).where(Article.id == article_id)) is None:
                     raise NotFound("Article not found")
 
-                base_stmt = select(Article).where(Article.parent_article_id == article_id)
-                total = session.scalar(select(func.count()).select_from(base_stmt.subquery())) or 0
-
-                rows = session.execute(
+                base_stmt = select(*_ARTICLE_COLUMNS).where(Article.parent_article_id == article_id)
+                result = session.execute(
                     base_stmt
+                    .add_columns(func.count().over().label("total"))
                     .order_by(Article.published_at.desc().nulls_last(), Article.id.desc())
                     .limit(limit)
                     .offset(offset)
-                ).scalars().all()
+                )
+                keys = list(result.keys())[:-1]
+                page = result.all()
+                if page:
+                    total = page[0][-1]
+                elif offset == 0:
+                    total = 0
+                else:
+                    total = session.scalar(select(func.count()).select_from(base_stmt.subquery())) or 0
 
                 self._json_ok({
                     "id": article_id,
                     "total": total,
                     "limit": limit,
                     "offset": offset,
-                    "items": [{
-                        "id": a.id,
-                        "source_id": a.source_id,
-                        "title": a.title,
-                        "link": a.link,
-                        "description": a.description,
-                        "guid": a.guid,
-                        "published_at": a.published_at,
-                        "fetched_at": a.fetched_at,
-                        "parent_article_id": a.parent_article_id,
-                    } for a in rows]
+                    "items": [dict(zip(keys, row)) for row in page],
                 })
 
         def get_article_parent(self, match, query):
@@ -910,21 +1134,14 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
             codes = [c.strip() for c in raw_codes.split(",") if c.strip()] if raw_codes else []
 
             with SessionLocal() as session:
-                stmt = select(Settings)
+                stmt = select(Settings.id, Settings.code, Settings.value)
                 if codes:
                     stmt = stmt.where(Settings.code.in_(codes))
                 stmt = stmt.order_by(Settings.code.asc())
 
-                rows = session.execute(stmt).scalars().all()
+                rows = session.execute(stmt).mappings().all()
 
-                self._json_ok([
-                    {
-                        "id": s.id,
-                        "code": s.code,
-                        "value": s.value,
-                    }
-                    for s in rows
-                ])
+                self._json_ok([dict(r) for r in rows])
 
         def update_settings(self, match, query):
             body = parse_json_body(self) or {}
@@ -997,32 +1214,32 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
                 if not fs_path.exists() or not fs_path.is_file():
                     return self._json_error(404, "not_found", "Media file not found")
                 file_size = fs_path.stat().st_size
-                mime, _ = mimetypes.guess_type(str(fs_path))
+                mime = _mime_for_suffix(fs_path.suffix.lower())
                 mime = mime or "application/octet-stream"
 
-                range = self.headers.get("Range")
+                range_header = self.headers.get("Range")
                 start, end = 0, file_size - 1
                 status = 200
                 extra_headers = []
 
-                if range and range.startswith("bytes="):
-                    try:
-                        part = range.split("=", 1)[1]
-                        s, _, e = part.partition("-")
-                        if s.strip():
-                            start = max(0, int(s))
-                        if e.strip():
-                            end = min(file_size - 1, int(e))
-                        if start > end:
-                            start, end = 0, file_size - 1
+                hit = _RANGE_MATCH(range_header) if range_header else None
+                if hit and (hit.group(1) or hit.group(2)):
+                    first, last = hit.groups()
+                    if first:
+                        start = int(first)
+                        if last:
+                            end = min(file_size - 1, int(last))
+                    else:
+                        # bytes=-N — последние N байт
+                        start = max(0, file_size - int(last))
+                    if start <= end:
                         status = 206
                         extra_headers.extend([
                             ("Content-Range", f"bytes {start}-{end}/{file_size}"),
                             ("Accept-Ranges", "bytes"),
                         ])
-                    except Exception:
+                    else:
                         start, end = 0, file_size - 1
-                        status = 200
 
                 length = end - start + 1
 
@@ -1036,15 +1253,14 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
                     for k, v in extra_headers:
                         self.send_header(k, v)
                     self.end_headers()
+                    if length <= 0:
+                        # пустой файл: тела нет, а socket.sendfile не принимает count=0
+                        return
                     with open(fs_path, "rb") as file:
-                        file.seek(start)
-                        remaining = length
-                        while remaining > 0:
-                            chunk = file.read(min(512 * 1024, remaining))
-                            if not chunk:
-                                break
-                            self.wfile.write(chunk)
-                            remaining -= len(chunk)
+                        # заголовки уже ушли в сокет (wfile без буфера); тело копирует ядро через sendfile,
+                        # где его нет — socket.sendfile сам откатывается на send-цикл
+                        self.wfile.flush()
+                        self.connection.sendfile(file, offset=start, count=length)
                     return
                 except (BrokenPipeError, ConnectionResetError):
                     return
@@ -1220,18 +1436,8 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
         # key words
         def list_key_words(self, match, query):
             with SessionLocal() as session:
-                rows = session.execute(
-                    select(KeyWord).order_by(KeyWord.id)
-                ).scalars().all()
-                self._json_ok([
-                    {
-                        "id": w.id,
-                        "code": w.code,
-                        "value": w.value,
-                        "rubric_id": w.rubric_id,
-                    }
-                    for w in rows
-                ])
+                rows = session.execute(_LIST_KEY_WORDS_STMT).mappings().all()
+                self._json_ok([dict(r) for r in rows])
 
         def upsert_key_word(self, match, query):
             body = parse_json_body(self) or {}
@@ -1329,18 +1535,8 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
         # stop words
         def list_stop_words(self, match, query):
             with SessionLocal() as session:
-                rows = session.execute(
-                    select(StopWord).order_by(StopWord.id)
-                ).scalars().all()
-                self._json_ok([
-                    {
-                        "id": w.id,
-                        "code": w.code,
-                        "value": w.value,
-                        "category_id": w.category_id,
-                    }
-                    for w in rows
-                ])
+                rows = session.execute(_LIST_STOP_WORDS_STMT).mappings().all()
+                self._json_ok([dict(r) for r in rows])
 
         def upsert_stop_word(self, match, query):
             body = parse_json_body(self) or {}
@@ -1437,13 +1633,8 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
         # rubrics
         def list_rubrics(self, match, query):
             with SessionLocal() as session:
-                rows = session.execute(
-                    select(Rubric).order_by(Rubric.id)
-                ).scalars().all()
-                self._json_ok([
-                    {"id": r.id, "code": r.code, "title": r.title}
-                    for r in rows
-                ])
+                rows = session.execute(_LIST_RUBRICS_STMT).mappings().all()
+                self._json_ok([dict(r) for r in rows])
 
         def upsert_rubric(self, match, query):
             body = parse_json_body(self) or {}
@@ -1526,15 +1717,8 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
         # stop categories
         def list_stop_categories(self, match, query):
             with SessionLocal() as session:
-                rows = session.execute(
-                    select(StopCategory)
-                    .where(StopCategory.is_active.is_(True))
-                    .order_by(StopCategory.id)
-                ).scalars().all()
-                self._json_ok([
-                    {"id": r.id, "code": r.code, "title": r.title}
-                    for r in rows
-                ])
+                rows = session.execute(_LIST_STOP_CATEGORIES_STMT).mappings().all()
+                self._json_ok([dict(r) for r in rows])
 
         def upsert_stop_category(self, match, query):
             body = parse_json_body(self) or {}
@@ -1622,7 +1806,12 @@ def run_server(host: str = "0.0.0.0", port: int = 8000):
     ensure_base_settings()
 
     register_auth_endpoints(Handler, Handler.routes)
-    httpd = HTTPServer((host, port), Handler)
+    # таблицы диспетчеризации строятся только из routes, включая маршруты авторизации
+    Handler.static_routes, Handler.id_routes, Handler.param_routes = _index_routes(Handler.routes)
+    Handler.handler_table = {name: getattr(Handler, name) for name in {route[2] for route in Handler.routes}}
+    warmup_auth_queries()
+    # каждый запрос обрабатывается в своём потоке, соединения к БД берутся из пула
+    httpd = _ApiServer((host, port), Handler)
     print(f"Server listening on {host}:{port}")
     httpd.serve_forever()
 
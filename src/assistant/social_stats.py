@@ -18,6 +18,7 @@ from src.db.social_stats import (
     insert_article_social_stat_history,
     upsert_article_social_stat,
 )
+from src.utils.logger import WARN
 
 
 _VK_LINK_RE = re.compile(r"wall(?P<owner>-?\d+)_(?P<post>\d+)")
@@ -92,7 +93,7 @@ def _collect_vk_stats(session, logger, items: list[tuple[int, int, int]], collec
             response = _vk_call("wall.getById", {"posts": ",".join(posts)})
             _sleep_throttle()
         except Exception as exc:
-            logger.write(f"[WARN] VK stats fetch failed: {exc}")
+            logger.write(f"[WARN] VK stats fetch failed: {exc}", level=WARN)
             continue
 
         for post in response or []:
@@ -155,10 +156,10 @@ async def _collect_tg_stats_async(logger, channel_items: Dict[str, Dict[int, int
             try:
                 messages = await client.get_messages(channel, ids=msg_ids)
             except ChannelPrivateError as exc:
-                logger.write(f"[WARN] TG stats skip channel={channel}: {exc}")
+                logger.write(f"[WARN] TG stats skip channel={channel}: {exc}", level=WARN)
                 continue
             except Exception as exc:
-                logger.write(f"[WARN] TG stats fetch failed for channel={channel}: {exc}")
+                logger.write(f"[WARN] TG stats fetch failed for channel={channel}: {exc}", level=WARN)
                 continue
             for msg in messages or []:
                 if msg is None:
@@ -176,7 +177,7 @@ async def _collect_tg_stats_async(logger, channel_items: Dict[str, Dict[int, int
                 pass
             await asyncio.sleep(0)
         except Exception as exc:
-            logger.write(f"[WARN] TG stats disconnect cleanup: {exc}")
+            logger.write(f"[WARN] TG stats disconnect cleanup: {exc}", level=WARN)
 
     return results
 
@@ -191,83 +192,86 @@ def _collect_tg_stats(logger, channel_items: Dict[str, Dict[int, int]]) -> Dict[
         return loop.run_until_complete(_collect_tg_stats_async(logger, channel_items))
 
 
-def run_social_stats_cycle(logger) -> int:
+def run_social_stats_cycle(logger, session=None) -> int:
+    if session is None:
+        with SessionLocal() as session:
+            return run_social_stats_cycle(logger, session)
+
     processed = 0
     collected_at = datetime.now(timezone.utc)
     cutoff = collected_at - timedelta(hours=24)
 
-    with SessionLocal() as session:
-        vk_rows = session.execute(
-            select(Article.id, Article.link, Article.guid)
-            .join(Source, Source.id == Article.source_id)
-            .where(Source.type == "vk")
-        ).all()
-
-        vk_items: list[tuple[int, int, int]] = []
-        for article_id, link, guid in vk_rows:
-            parsed = _parse_vk_ids(link, guid)
-            if not parsed:
-                continue
-            owner_id, post_id = parsed
-            vk_items.append((article_id, owner_id, post_id))
+    vk_rows = session.execute(
+        select(Article.id, Article.link, Article.guid)
+        .join(Source, Source.id == Article.source_id)
+        .where(Source.type == "vk")
+    ).all()
 
-        processed += _collect_vk_stats(session, logger, vk_items, collected_at)
+    vk_items: list[tuple[int, int, int]] = []
+    for article_id, link, guid in vk_rows:
+        parsed = _parse_vk_ids(link, guid)
+        if not parsed:
+            continue
+        owner_id, post_id = parsed
+        vk_items.append((article_id, owner_id, post_id))
 
-        tg_rows = session.execute(
-            select(Article.id, Article.link)
-            .join(Source, Source.id == Article.source_id)
-            .where(Source.type == "tg", Article.parent_article_id.is_(None))
-        ).all()
+    processed += _collect_vk_stats(session, logger, vk_items, collected_at)
 
-        channel_items: Dict[str, Dict[int, int]] = {}
-        for article_id, link in tg_rows:
-            parsed = _parse_tg_ids(link)
-            if not parsed:
-                continue
-            channel, msg_id = parsed
-            channel_items.setdefault(channel, {})[msg_id] = article_id
+    tg_rows = session.execute(
+        select(Article.id, Article.link)
+        .join(Source, Source.id == Article.source_id)
+        .where(Source.type == "tg", Article.parent_article_id.is_(None))
+    ).all()
 
-        tg_stats = _collect_tg_stats(logger, channel_items)
-        for article_id, counts in tg_stats.items():
-            like_count, repost_count, comment_count, view_count = counts
-            engagement_score = compute_engagement_score(
-                like_count,
-                repost_count,
-                comment_count,
-            )
-            insert_article_social_stat_history(
-                session,
-                article_id,
-                like_count,
-                repost_count,
-                comment_count,
-                view_count,
-                engagement_score,
-                collected_at,
-            )
-            previous_engagement = _get_previous_engagement(session, article_id, cutoff)
-            engagement_delta = None
-            is_trending = False
-            if previous_engagement and previous_engagement > 0:
-                engagement_delta = (engagement_score - previous_engagement) / previous_engagement
-                is_trending = engagement_delta > 2.0
-            upsert_article_social_stat(
-                session,
-                article_id,
-                like_count,
-                repost_count,
-                comment_count,
-                view_count,
-                engagement_score,
-                previous_engagement,
-                engagement_delta,
-                is_trending,
-                collected_at,
-            )
-            processed += 1
+    channel_items: Dict[str, Dict[int, int]] = {}
+    for article_id, link in tg_rows:
+        parsed = _parse_tg_ids(link)
+        if not parsed:
+            continue
+        channel, msg_id = parsed
+        channel_items.setdefault(channel, {})[msg_id] = article_id
+
+    tg_stats = _collect_tg_stats(logger, channel_items)
+    for article_id, counts in tg_stats.items():
+        like_count, repost_count, comment_count, view_count = counts
+        engagement_score = compute_engagement_score(
+            like_count,
+            repost_count,
+            comment_count,
+        )
+        insert_article_social_stat_history(
+            session,
+            article_id,
+            like_count,
+            repost_count,
+            comment_count,
+            view_count,
+            engagement_score,
+            collected_at,
+        )
+        previous_engagement = _get_previous_engagement(session, article_id, cutoff)
+        engagement_delta = None
+        is_trending = False
+        if previous_engagement and previous_engagement > 0:
+            engagement_delta = (engagement_score - previous_engagement) / previous_engagement
+            is_trending = engagement_delta > 2.0
+        upsert_article_social_stat(
+            session,
+            article_id,
+            like_count,
+            repost_count,
+            comment_count,
+            view_count,
+            engagement_score,
+            previous_engagement,
+            engagement_delta,
+            is_trending,
+            collected_at,
+        )
+        processed += 1
 
-        if processed:
-            session.commit()
+    if processed:
+        session.commit()
 
     logger.write(f"[SOCIAL-STATS] updated={processed}")
     return processed
@@ -24,17 +24,22 @@ SUBMIT_TIMEOUT = float(os.getenv("TG_AUTH_SUBMIT_TIMEOUT", "10"))
 
 _loop: asyncio.AbstractEventLoop | None = None
 _loop_thread: threading.Thread | None = None
+_loop_lock = threading.Lock()
 
 def _ensure_background_loop():
     global _loop, _loop_thread
     if _loop is not None:
         return _loop
-    _loop = asyncio.new_event_loop()
-    def _runner():
-        asyncio.set_event_loop(_loop)
-        _loop.run_forever()
-    _loop_thread = threading.Thread(target=_runner, name="tg-auth-loop", daemon=True)
-    _loop_thread.start()
+    with _loop_lock:
+        if _loop is not None:
+            return _loop
+        loop = asyncio.new_event_loop()
+        def _runner():
+            asyncio.set_event_loop(loop)
+            loop.run_forever()
+        _loop_thread = threading.Thread(target=_runner, name="tg-auth-loop", daemon=True)
+        _loop_thread.start()
+        _loop = loop
     return _loop
 
 def _submit(coroutine: "asyncio.coroutines", timeout: float = SUBMIT_TIMEOUT) -> Any:
@@ -16,6 +16,7 @@ from src.db.social_stats import (
     insert_article_social_stat_history,
     upsert_article_social_stat,
 )
+from src.utils.logger import WARN, ERROR
 
 from pathlib import Path
 import json
@@ -177,7 +178,7 @@ async def _process_tg_source(client: TelegramClient, source: Source, logger) ->
     max_bytes = None if max_mb <= 0 else int(max_mb) * 1024 * 1024
     channel = _channel_from_url(source.rss_url or "")
     if not channel:
-        logger.write(f"[ERROR] TG invalid URL: {source.rss_url}")
+        logger.write(f"[ERROR] TG invalid URL: {source.rss_url}", level=ERROR)
         return 0
 
     added = 0
@@ -323,7 +324,7 @@ async def _process_tg_source(client: TelegramClient, source: Source, logger) ->
                             fetched_at,
                         )
                     except Exception as exception:
-                        logger.write(f"[WARN] TG stats update failed for {channel}/{msg.id}: {exception}")
+                        logger.write(f"[WARN] TG stats update failed for {channel}/{msg.id}: {exception}", level=WARN)
 
                 session.commit()
                 added += 1
@@ -333,16 +334,16 @@ async def _process_tg_source(client: TelegramClient, source: Source, logger) ->
                     try:
                         await download_tg_media_for_message(client, msg, channel, max_bytes)
                     except Exception as exception:
-                        logger.write(f"[WARN] TG media download failed for {channel}/{msg.id}: {exception}")
+                        logger.write(f"[WARN] TG media download failed for {channel}/{msg.id}: {exception}", level=WARN)
 
     except FloodWaitError as error:
         wait_s = int(getattr(error, "seconds", TG_SLEEP_ON_FLOOD) or TG_SLEEP_ON_FLOOD)
-        logger.write(f"[WARN] TG FloodWait {wait_s}s for {channel}")
+        logger.write(f"[WARN] TG FloodWait {wait_s}s for {channel}", level=WARN)
         await asyncio.sleep(wait_s)
     except RPCError as error:
-        logger.write(f"[ERROR] TG RPC for {channel}: {error}")
+        logger.write(f"[ERROR] TG RPC for {channel}: {error}", level=ERROR)
     except Exception as error:
-        logger.write(f"[ERROR] TG unexpected for {channel}: {error}")
+        logger.write(f"[ERROR] TG unexpected for {channel}: {error}", level=ERROR)
 
     return added
 
@@ -358,10 +359,10 @@ async def _run_tg_cycle_async(logger) -> int:
     total = 0
     try:
         with SessionLocal() as session:
-            sources = session.execute(select(Source).where(Source.enabled == True)).scalars().all()
+            sources = session.execute(
+                select(Source.id, Source.name, Source.rss_url).where(Source.enabled.is_(True), Source.type == "tg")
+            ).all()
         for source in sources:
-            if source.type != "tg" or not source.enabled:
-                continue
             total += await _process_tg_source(client, source, logger)
     finally:
         try:
@@ -372,19 +373,22 @@ async def _run_tg_cycle_async(logger) -> int:
                 pass
             await asyncio.sleep(0)
         except Exception as exception:
-            logger.write(f"[WARN] TG disconnect cleanup: {exception}")
+            logger.write(f"[WARN] TG disconnect cleanup: {exception}", level=WARN)
     return total
 
 def run_tg_cycle(logger) -> int:
     try:
         return asyncio.run(_run_tg_cycle_async(logger))
     except RuntimeError:
-        loop = asyncio.get_event_loop()
+        # цикл запускается в рабочем потоке, где get_event_loop() сам бросает RuntimeError
+        loop = asyncio.new_event_loop()
         try:
             return loop.run_until_complete(_run_tg_cycle_async(logger))
         except Exception as exception:
-            logger.write(f"[ERROR] TG cycle failed: {exception}")
+            logger.write(f"[ERROR] TG cycle failed: {exception}", level=ERROR)
             return 0
+        finally:
+            loop.close()
     except Exception as exception:
-        logger.write(f"[ERROR] TG cycle failed: {exception}")
+        logger.write(f"[ERROR] TG cycle failed: {exception}", level=ERROR)
         return 0
@@ -5,10 +5,11 @@ from datetime import datetime, timezone
 from typing import Dict, Tuple
 
 import httpx
-from sqlalchemy import select, or_
+from sqlalchemy import select
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from src.db.db import SessionLocal
+from src.db.articles import existing_article_keys
 from src.db.models.source import Source
 from src.db.models.article import Article
 from src.utils.settings import get_setting_bool, get_setting_int
@@ -17,6 +18,7 @@ from src.db.social_stats import (
     insert_article_social_stat_history,
     upsert_article_social_stat,
 )
+from src.utils.logger import WARN, ERROR
 
 from pathlib import Path
 import json
@@ -165,15 +167,21 @@ def process_vk_source(session, source, logger) -> int:
     try:
         owner_id = owner_id_from_url(source.rss_url)
     except Exception as exception:
-        logger.write(f"[ERROR] VK resolve failed for {source.rss_url}: {exception}")
+        logger.write(f"[ERROR] VK resolve failed for {source.rss_url}: {exception}", level=ERROR)
         return 0
 
     try:
         posts = fetch_wall(owner_id, count=100)
     except Exception as exception:
-        logger.write(f"[ERROR] VK API for {source.rss_url}: {exception}")
+        logger.write(f"[ERROR] VK API for {source.rss_url}: {exception}", level=ERROR)
         return 0
 
+    seen_guids, seen_links = existing_article_keys(
+        session, source.id,
+        [f"vk:{owner_id}:{post['id']}" for post in posts if post.get("id")],
+        [f"https://vk.com/wall{owner_id}_{post['id']}" for post in posts if post.get("id")],
+    )
+
     added = 0
     for post in posts:
         post_id = post.get("id")
@@ -188,16 +196,10 @@ def process_vk_source(session, source, logger) -> int:
         published_at = _utc_from_timestamp(int(post["date"])) if "date" in post else None
         now_utc = datetime.now(timezone.utc)
 
-        exists = session.scalar(
-            select(Article.id)
-            .where(
-                (Article.source_id == source.id) &
-                (or_(Article.guid == guid, Article.link == link))
-            )
-            .limit(1)
-        )
-        if exists:
+        if guid in seen_guids or link in seen_links:
             continue
+        seen_guids.add(guid)
+        seen_links.add(link)
 
         stmt = (
             pg_insert(Article)
@@ -251,13 +253,13 @@ def process_vk_source(session, source, logger) -> int:
                     now_utc,
                 )
             except Exception as exception:
-                logger.write(f"[WARN] VK stats update failed for post {owner_id}_{post_id}: {exception}")
+                logger.write(f"[WARN] VK stats update failed for post {owner_id}_{post_id}: {exception}", level=WARN)
             if media_keep:
                 try:
                     with httpx.Client(timeout=FETCH_TIMEOUT, follow_redirects=True) as client:
                         download_vk_media_for_post(post, owner_id, client, max_bytes)
                 except Exception as exception:
-                    logger.write(f"[WARN] VK media download failed for post {owner_id}_{post_id}: {exception}")
+                    logger.write(f"[WARN] VK media download failed for post {owner_id}_{post_id}: {exception}", level=WARN)
 
     if added:
         session.commit()
@@ -266,12 +268,12 @@ def process_vk_source(session, source, logger) -> int:
 def run_vk_cycle(logger) -> int:
     total_added = 0
     with SessionLocal() as session:
-        sources = session.execute(select(Source).where(Source.enabled == True)).scalars().all()
+        sources = session.execute(
+            select(Source.id, Source.name, Source.rss_url).where(Source.enabled.is_(True), Source.type == "vk")
+        ).all()
         for source in sources:
-            if source.type != "vk" or not source.enabled:
-                continue
             try:
                 total_added += process_vk_source(session, source, logger)
             except Exception as e:
-                logger.write(f"[ERROR] VK unexpected for {source.rss_url}: {e}")
+                logger.write(f"[ERROR] VK unexpected for {source.rss_url}: {e}", level=ERROR)
     return total_added
\ No newline at end of file
@@ -0,0 +1,16 @@
+from sqlalchemy import select, or_
+
+from src.db.models.article import Article
+
+
+def existing_article_keys(session, source_id: int, guids: list[str], links: list[str]) -> tuple[set, set]:
+    if not guids and not links:
+        return set(), set()
+    rows = session.execute(
+        select(Article.guid, Article.link)
+        .where(
+            Article.source_id == source_id,
+            or_(Article.guid.in_(guids), Article.link.in_(links)),
+        )
+    ).all()
+    return {row.guid for row in rows}, {row.link for row in rows}
@@ -1,5 +1,8 @@
 import os
-from sqlalchemy import create_engine, inspect
+import re
+import time
+from sqlalchemy import bindparam, create_engine, inspect, text
+from sqlalchemy.exc import DBAPIError, OperationalError
 from sqlalchemy.orm import sessionmaker
 from src.db.models.base import Base
 
@@ -10,12 +13,36 @@ pg_host = os.getenv("POSTGRES_HOST", os.getenv("DB_HOST", "db"))
 pg_port = os.getenv("POSTGRES_PORT", os.getenv("DB_PORT", "5432"))
 DATABASE_URL = f"postgresql+psycopg://{pg_user}:{pg_password}@{pg_host}:{pg_port}/{pg_db}"
 
-engine = create_engine(DATABASE_URL, echo=False, pool_pre_ping=True)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "40"))
+DB_POOL_RECYCLE_SEC = int(os.getenv("DB_POOL_RECYCLE_SEC", "1800"))
+DB_CONNECT_RETRIES = int(os.getenv("DB_CONNECT_RETRIES", "30"))
+
+engine = create_engine(
+    DATABASE_URL,
+    echo=False,
+    pool_pre_ping=False,
+    pool_recycle=DB_POOL_RECYCLE_SEC,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+)
 SessionLocal = sessionmaker(bind=engine)
 
 REQUIRED_TABLES = {"sources", "articles", "users", "sessions", "auth_codes", "rubric", "settings",
                    "article_key_word", "article_stat", "article_social_stat", "article_social_stat_history", "stop_word", "stop_category", "key_word", "article_stop_word"}
 
+# pool_pre_ping is off, so liveness is checked once here instead of on every checkout
+def wait_for_db(retries: int = DB_CONNECT_RETRIES, delay: float = 1.0) -> bool:
+    for attempt in range(1, retries + 1):
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            return True
+        except OperationalError as error:
+            print(f"DB is not ready ({attempt}/{retries}): {error}")
+            time.sleep(delay)
+    return False
+
 def create_schema():
     Base.metadata.create_all(engine)
 
@@ -23,4 +50,70 @@ def schema_exists() -> bool:
     with engine.begin() as connection:
         inspection = inspect(connection)
         existing = set(inspection.get_table_names(schema="public"))
-        return REQUIRED_TABLES.issubset(existing)
\ No newline at end of file
+        return REQUIRED_TABLES.issubset(existing)
+
+# Idempotent DDL for databases created before the corresponding model change.
+# CONCURRENTLY cannot run inside a transaction, so these run in autocommit mode.
+SCHEMA_UPGRADES = [
+    "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_sessions_hash ON sessions (session_hash)",
+    "ALTER TABLE sessions DROP CONSTRAINT IF EXISTS sessions_session_hash_key",
+    "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_auth_codes_active_per_user_purpose ON auth_codes (user_id, purpose)",
+    "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_users_email ON users (email)",
+    "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_users_login ON users (login)",
+    "ALTER TABLE sources ADD COLUMN IF NOT EXISTS http_etag TEXT",
+    "ALTER TABLE sources ADD COLUMN IF NOT EXISTS http_last_modified TEXT",
+    # поиск статей идёт через ILIKE и trigram-индексы; tsvector-колонка больше не читается, но стоила бы записи
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_articles_search_tsv",
+    "ALTER TABLE articles DROP COLUMN IF EXISTS search_tsv",
+    # trigram-индексы держат подстрочный ILIKE '%q%' в поиске статей; живут только здесь,
+    # потому что create_all не умеет создавать расширение
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_articles_title_trgm ON articles USING gin (title gin_trgm_ops)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_articles_description_trgm ON articles USING gin (description gin_trgm_ops)",
+]
+
+_CONCURRENT_INDEX_NAME = re.compile(r"CREATE (?:UNIQUE )?INDEX CONCURRENTLY IF NOT EXISTS (\w+)")
+
+def _drop_invalid_index(connection, name: str):
+    # упавший CREATE INDEX CONCURRENTLY оставляет INVALID-индекс, и IF NOT EXISTS потом молча его пропускает
+    valid = connection.execute(
+        text("SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"),
+        {"name": name},
+    ).scalar()
+    if valid is False:
+        print(f"DB schema upgrade: dropping invalid index {name}")
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+_TRGM_INDEXES = ("ix_articles_title_trgm", "ix_articles_description_trgm")
+
+def _check_search_indexes(connection):
+    valid = set(connection.execute(
+        text(
+            "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname IN :names AND i.indisvalid"
+        ).bindparams(bindparam("names", expanding=True)),
+        {"names": list(_TRGM_INDEXES)},
+    ).scalars())
+    missing = [name for name in _TRGM_INDEXES if name not in valid]
+    if missing:
+        print(f"[ERROR] Trigram indexes missing ({', '.join(missing)}): article search will scan the whole table")
+
+def upgrade_schema():
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for statement in SCHEMA_UPGRADES:
+            # одна неудачная операция (нет прав на CREATE EXTENSION, дубли под уникальный индекс)
+            # не должна блокировать остальные и ронять запуск
+            try:
+                index = _CONCURRENT_INDEX_NAME.match(statement)
+                if index:
+                    _drop_invalid_index(connection, index.group(1))
+                connection.execute(text(statement))
+            except DBAPIError as error:
+                print(f"DB schema upgrade skipped: {statement}: {error}")
+                if index:
+                    # не оставляем недостроенный индекс: он обновляется на каждую запись, но не используется
+                    try:
+                        _drop_invalid_index(connection, index.group(1))
+                    except DBAPIError as drop_error:
+                        print(f"DB schema upgrade: failed to drop invalid index {index.group(1)}: {drop_error}")
+        _check_search_indexes(connection)
@@ -1,4 +1,4 @@
-from src.db.db import schema_exists, create_schema
+from src.db.db import schema_exists, create_schema, upgrade_schema, wait_for_db
 from sqlalchemy.exc import OperationalError, ProgrammingError
 import src.db.models.article
 import src.db.models.article_key_word
@@ -17,12 +17,16 @@ import src.db.models.stop_word
 import src.db.models.user
 
 def schema_init():
+    if not wait_for_db():
+        print("DB is unreachable, skipping schema init")
+        return
     try:
         if schema_exists():
             print("DB schema already exists")
         else:
             create_schema()
             print("DB schema created")
+        upgrade_schema()
     except OperationalError as error:
         print(f"DB schema is not ready: {error}")
     except ProgrammingError as error:
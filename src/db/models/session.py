@@ -15,7 +15,7 @@ class Session(Base):
     )
 
     session_hash: Mapped[str] = mapped_column(
-        String(128), nullable=False, unique=True
+        String(128), nullable=False
     )
 
     created_at: Mapped[datetime] = mapped_column(
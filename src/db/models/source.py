@@ -2,6 +2,7 @@ from src.db.models.base import Base
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy import DateTime, Text, Boolean, Index
 from datetime import datetime, timezone
+from typing import Optional
 from sqlalchemy import Enum
 
 class Source(Base):
@@ -17,6 +18,10 @@ class Source(Base):
     enabled: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True),nullable=False,default=lambda: datetime.now(timezone.utc))
 
+    # валидаторы последнего ответа ленты для conditional GET
+    http_etag: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    http_last_modified: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
     articles: Mapped[list["Article"]] = relationship(back_populates="source", cascade="all, delete-orphan")
 
     __table_args__ = (
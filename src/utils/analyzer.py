@@ -3,6 +3,7 @@ from collections import Counter, defaultdict
 
 import pymorphy3
 from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from src.db.models.article import Article
 from src.db.models.stop_word import StopWord
@@ -52,8 +53,11 @@ def _build_index(word_items):
 
 
 def count_words_for_items(word_items, text: str):
+    return _count_words_with_index(_build_index(word_items), text)
+
+
+def _count_words_with_index(index, text: str):
     tokens_counter = _normalize_text_to_counter(text)
-    index = _build_index(word_items)
 
     counts_by_id = {}
     total = 0
@@ -79,6 +83,12 @@ def _collect_article_text(article: Article) -> str:
     return " ".join(part for part in (article.title, article.description) if part)
 
 
+def _top_group_id(group_counts):
+    if not group_counts:
+        return None
+    return sorted(group_counts.items(), key=lambda it: (-it[1], it[0]))[0][0]
+
+
 def _persist_article_analysis(
     session,
     article: Article,
@@ -88,6 +98,7 @@ def _persist_article_analysis(
     key_counts_by_id: dict,
     key_total: int,
     rubric_counts,
+    commit: bool = True,
 ) -> ArticleStat:
     session.execute(
         delete(ArticleStopWord).where(ArticleStopWord.entity_id == article.id)
@@ -108,17 +119,8 @@ def _persist_article_analysis(
                 ArticleKeyWord(entity_id=article.id, key_word_id=key_id)
             )
 
-    rubric_id = None
-    if rubric_counts:
-        rubric_id = sorted(
-            rubric_counts.items(), key=lambda it: (-it[1], it[0])
-        )[0][0]
-
-    stop_category_id = None
-    if category_counts:
-        stop_category_id = sorted(
-            category_counts.items(), key=lambda it: (-it[1], it[0])
-        )[0][0]
+    rubric_id = _top_group_id(rubric_counts)
+    stop_category_id = _top_group_id(category_counts)
 
     stats = session.get(ArticleStat, article.id)
     if not stats:
@@ -130,70 +132,107 @@ def _persist_article_analysis(
     stats.rubric_id = rubric_id
     stats.stop_category_id = stop_category_id
 
-    session.commit()
-    session.refresh(stats)
+    if commit:
+        session.commit()
+        session.refresh(stats)
     return stats
 
 
-def _analyze_article_words_legacy(session, article: Article) -> ArticleStat:
-    full_text = _collect_article_text(article)
-
+def _load_word_indexes(session, use_ml_analysis: bool):
     stop_words = session.execute(select(StopWord)).scalars().all()
-    stop_items = [(w.id, w.value, w.category_id) for w in stop_words]
-    stop_counts_by_id, stop_total, category_counts = count_words_for_items(
-        stop_items, full_text
-    )
+    stop_index = _build_index([(w.id, w.value, w.category_id) for w in stop_words])
 
-    key_words = session.execute(select(KeyWord)).scalars().all()
-    key_items = [(w.id, w.value, w.rubric_id) for w in key_words]
-    key_counts_by_id, key_total, rubric_counts = count_words_for_items(
-        key_items, full_text
+    keywords = session.execute(select(KeyWord)).scalars().all()
+    if use_ml_analysis:
+        return stop_index, [(kw.id, kw.value, kw.rubric_id) for kw in keywords]
+    return stop_index, _build_index([(w.id, w.value, w.rubric_id) for w in keywords])
+
+
+def _compute_article_analysis(article, use_ml_analysis: bool, stop_index, key_data):
+    full_text = _collect_article_text(article)
+
+    stop_counts_by_id, stop_total, category_counts = _count_words_with_index(
+        stop_index, full_text
     )
 
+    if use_ml_analysis:
+        key_counts_by_id = {}
+        rubric_counts = defaultdict(int)
+        keyword_texts = [value for _, value, _ in key_data]
+        relevance_scores = Relevance(full_text, keyword_texts) if keyword_texts else []
+        if relevance_scores:
+            threshold = 0.45
+            for (kw_id, _, rubric_id), score in zip(key_data, relevance_scores):
+                if score > threshold:
+                    key_counts_by_id[kw_id] = float(score)
+                    rubric_counts[rubric_id] += 1
+        key_total = len(key_counts_by_id)
+    else:
+        key_counts_by_id, key_total, rubric_counts = _count_words_with_index(
+            key_data, full_text
+        )
+
+    return stop_counts_by_id, stop_total, category_counts, key_counts_by_id, key_total, rubric_counts
+
+
+def _analyze_with_indexes(session, article, use_ml_analysis: bool, stop_index, key_data, commit: bool = True) -> ArticleStat:
     return _persist_article_analysis(
         session,
         article,
-        stop_counts_by_id,
-        stop_total,
-        category_counts,
-        key_counts_by_id,
-        key_total,
-        rubric_counts,
+        *_compute_article_analysis(article, use_ml_analysis, stop_index, key_data),
+        commit=commit,
     )
 
 
-def _analyze_article_words_ml(session, article: Article) -> ArticleStat:
-    full_text = _collect_article_text(article)
+# одна вставка не должна упереться в лимит параметров Postgres (65535)
+_INSERT_ROWS_PER_STATEMENT = 5000
+
+
+def _insert_rows(session, model, rows):
+    for start in range(0, len(rows), _INSERT_ROWS_PER_STATEMENT):
+        session.execute(
+            pg_insert(model).values(rows[start:start + _INSERT_ROWS_PER_STATEMENT]).on_conflict_do_nothing()
+        )
+
+
+def _insert_new_articles_analysis(session, chunk, use_ml_analysis: bool, stop_index, key_data):
+    # статьи без ArticleStat: удалять нечего, поэтому вместо DELETE/get/add на каждую статью —
+    # по одному многострочному INSERT на таблицу
+    stop_rows, key_rows, stat_rows = [], [], []
+    for article in chunk:
+        (stop_counts_by_id, stop_total, category_counts,
+         key_counts_by_id, key_total, rubric_counts) = _compute_article_analysis(
+            article, use_ml_analysis, stop_index, key_data
+        )
+        stop_rows.extend(
+            {"entity_id": article.id, "stop_word_id": stop_id}
+            for stop_id, count in stop_counts_by_id.items() if count > 0
+        )
+        key_rows.extend(
+            {"entity_id": article.id, "key_word_id": key_id}
+            for key_id, count in key_counts_by_id.items() if count > 0
+        )
+        stat_rows.append({
+            "entity_id": article.id,
+            "stop_words_count": int(stop_total),
+            "key_words_count": int(key_total),
+            "rubric_id": _top_group_id(rubric_counts),
+            "stop_category_id": _top_group_id(category_counts),
+        })
+
+    _insert_rows(session, ArticleStopWord, stop_rows)
+    _insert_rows(session, ArticleKeyWord, key_rows)
+    _insert_rows(session, ArticleStat, stat_rows)
 
-    stop_words = session.execute(select(StopWord)).scalars().all()
-    stop_items = [(w.id, w.value, w.category_id) for w in stop_words]
-    stop_counts_by_id, stop_total, category_counts = count_words_for_items(
-        stop_items, full_text
-    )
 
-    keywords = session.execute(select(KeyWord)).scalars().all()
-    keyword_texts = [kw.value for kw in keywords]
-    key_counts_by_id = {}
-    rubric_counts = defaultdict(int)
-
-    relevance_scores = Relevance(full_text, keyword_texts) if keyword_texts else []
-    if relevance_scores:
-        threshold = 0.45
-        for kw, score in zip(keywords, relevance_scores):
-            if score > threshold:
-                key_counts_by_id[kw.id] = float(score)
-                rubric_counts[kw.rubric_id] += 1
+def _analyze_article_words_legacy(session, article: Article) -> ArticleStat:
+    stop_index, key_index = _load_word_indexes(session, False)
+    return _analyze_with_indexes(session, article, False, stop_index, key_index)
 
-    return _persist_article_analysis(
-        session,
-        article,
-        stop_counts_by_id,
-        stop_total,
-        category_counts,
-        key_counts_by_id,
-        len(key_counts_by_id),
-        rubric_counts,
-    )
+
+def _analyze_article_words_ml(session, article: Article) -> ArticleStat:
+    stop_index, key_items = _load_word_indexes(session, True)
+    return _analyze_with_indexes(session, article, True, stop_index, key_items)
 
 
 def analyze_article_words(
@@ -214,20 +253,44 @@ def analyze_article_words(
 
 
 def analyze_all_articles(session) -> int:
+    articles = session.execute(
+        select(Article.id, Article.title, Article.description).order_by(Article.id)
+    ).all()
+    processed, failures = analyze_articles_words(session, articles)
+    for article_id, exception in failures:
+        print(f"[WARN] failed to analyze article {article_id}: {exception}")
+    return processed
+
+
+def analyze_articles_words(session, articles, batch_size: int = 500, new_only: bool = False) -> tuple[int, list]:
+    # articles — строки (id, title, description); словари и лемматизация слов строятся один раз на вызов.
+    # new_only — у статей ещё нет ArticleStat и связей со словами, пачку можно писать многострочными INSERT
     use_ml_analysis = get_setting_bool("use_ml_news_analysis", False)
-    processed = 0
-    article_ids = session.execute(select(Article.id)).scalars().all()
+    stop_index, key_data = _load_word_indexes(session, use_ml_analysis)
 
-    for article_id in article_ids:
+    processed = 0
+    failures = []
+    for start in range(0, len(articles), batch_size):
+        chunk = articles[start:start + batch_size]
         try:
-            analyze_article_words(
-                session,
-                article_id,
-                use_ml_analysis=use_ml_analysis,
-            )
-            processed += 1
-        except Exception as exception:
+            if new_only:
+                _insert_new_articles_analysis(session, chunk, use_ml_analysis, stop_index, key_data)
+            else:
+                for article in chunk:
+                    _analyze_with_indexes(session, article, use_ml_analysis, stop_index, key_data, commit=False)
+            session.commit()
+            processed += len(chunk)
+            continue
+        except Exception:
             session.rollback()
-            print(f"[WARN] failed to analyze article {article_id}: {exception}")
 
-    return processed
+        # пачка не сохранилась — повторяем по одной, чтобы найти и пропустить сбойные статьи
+        for article in chunk:
+            try:
+                _analyze_with_indexes(session, article, use_ml_analysis, stop_index, key_data)
+                processed += 1
+            except Exception as exception:
+                session.rollback()
+                failures.append((article.id, exception))
+
+    return processed, failures
@@ -1,30 +1,95 @@
 import os
-from datetime import datetime, timezone
+import atexit
+import threading
+import time
 
 LOG_DIR = "./log"
+LOG_BUFFER_SIZE = 1 << 16
+LOG_FLUSH_INTERVAL_SEC = float(os.getenv("LOG_FLUSH_INTERVAL_SEC", "1.0"))
+
+DEBUG = 10
+INFO = 20
+WARN = 30
+ERROR = 40
+_LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARN": WARN, "WARNING": WARN, "ERROR": ERROR}
+_LEVEL = _LEVELS.get(os.getenv("LOG_LEVEL", "INFO").upper(), INFO)
+
+# фоновый сброс буферов: в тишине (парсер спит, сервер простаивает) write() не вызывается
+_loggers: list["Logger"] = []
+_flusher_lock = threading.Lock()
+_flusher_started = False
+
+def _flush_loop():
+    while True:
+        time.sleep(LOG_FLUSH_INTERVAL_SEC)
+        for logger in list(_loggers):
+            try:
+                logger.flush()
+            except Exception:
+                pass
+
+def _start_background_flush():
+    global _flusher_started
+    with _flusher_lock:
+        if _flusher_started:
+            return
+        _flusher_started = True
+    threading.Thread(target=_flush_loop, name="log-flush", daemon=True).start()
 
 class Logger:
     def __init__(self, logger_type: str):
         self._path = None
+        self._day = None
         self._logger_type = logger_type
         self._file = None
+        self._last_flush = time.monotonic()
+        self._ts = (None, "")
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+        _loggers.append(self)
+        _start_background_flush()
 
     def ensure_log_dir(self):
         os.makedirs(os.path.join(LOG_DIR, self._logger_type), exist_ok=True)
 
     def _log_path_for_today(self) -> str:
-        return os.path.join(LOG_DIR, self._logger_type, datetime.now(timezone.utc).strftime(f"{self._logger_type}_%Y-%m_%d.log"))
+        return os.path.join(LOG_DIR, self._logger_type, time.strftime(f"{self._logger_type}_%Y-%m_%d.log", time.gmtime()))
 
-    def _reopen_if_needed(self):
+    def _reopen_if_needed(self, now: float):
+        day = int(now) // 86400
+        if day == self._day:
+            return
+        self._day = day
         path = self._log_path_for_today()
         if path != self._path:
             if self._file:
                 self._file.close()
             self._path = path
-            self._file = open(self._path, "a", encoding="utf-8")
+            self._file = open(self._path, "a", encoding="utf-8", buffering=LOG_BUFFER_SIZE)
+
+    def _flush_locked(self):
+        if self._file:
+            self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
 
-    def write(self, line: str):
-        self._reopen_if_needed()
-        log_time = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-        self._file.write(f"{log_time} {line.rstrip()}\n")
-        self._file.flush()
\ No newline at end of file
+    def write(self, line: str, *args, level: int = INFO):
+        if level < _LEVEL:
+            return
+        if args:
+            line = line % args
+        now = time.time()
+        sec = int(now)
+        ts_sec, log_time = self._ts
+        if sec != ts_sec:
+            log_time = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(sec))
+            self._ts = (sec, log_time)
+        entry = f"{log_time} {line.rstrip()}\n"
+        with self._lock:
+            self._reopen_if_needed(now)
+            self._file.write(entry)
+            if time.monotonic() - self._last_flush >= LOG_FLUSH_INTERVAL_SEC:
+                self._flush_locked()
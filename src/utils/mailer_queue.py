@@ -0,0 +1,26 @@
+import os, queue, threading
+
+from src.utils.mailer import send_email
+
+MAIL_QUEUE_SIZE = int(os.getenv("SMTP_QUEUE_SIZE", "1024"))
+
+_MAIL_Q: queue.Queue = queue.Queue(maxsize=MAIL_QUEUE_SIZE)
+
+def _worker() -> None:
+    while True:
+        to, subject, text, html = _MAIL_Q.get()
+        try:
+            send_email(to, subject, text, html)
+        except Exception as exception:
+            print(f"[MAIL/ERROR] queued send to {to} failed: {type(exception).__name__}: {exception}")
+        finally:
+            _MAIL_Q.task_done()
+
+threading.Thread(target=_worker, name="mailer-queue", daemon=True).start()
+
+def enqueue_email(to: str, subject: str, text: str, html: str | None = None) -> None:
+    try:
+        _MAIL_Q.put_nowait((to, subject, text, html))
+    except queue.Full:
+        print(f"[MAIL/WARN] queue is full, sending to {to} synchronously")
+        send_email(to, subject, text, html)